@@ -5,15 +5,102 @@ class Settings(BaseSettings):
     chroma_port: int = 8000
     chroma_path: str = "../../chroma"
 
+    # 向量库后端：chroma，或进程内基于 memmap 矩阵暴力检索的 numpy
+    vector_backend: str = "chroma"
+    numpy_store_path: str = "../../numpy_store"
+    # 启动时预先加载的集合，逗号分隔；预热完成后 /health/ready 才报告就绪
+    warmup_collections: str = ""
+    # numpy 后端的向量量化：none、int8 或 pq；rerank_factor 为 0 时不做精排
+    numpy_quantization: str = "none"
+    numpy_pq_subspaces: int = 64
+    numpy_rerank_factor: int = 4
+
     query_model: str = "bge-m3"
     query_api_base: str = "http://10.176.64.152:11435/v1"
     query_api_key: str = "API_KEY_IS_NOT_NEEDED"
 
+    # 入库时显式使用该模型嵌入，查询时使用 query_model，两者必须是同一个模型
     embedding_model: str = "bge-m3"
     embedding_api_base: str = "http://10.176.64.152:11435/v1/embeddings"
+    embedding_timeout: float = 60.0
+    embedding_connect_timeout: float = 5.0
+    embedding_max_connections: int = 16
+    # 微批窗口（毫秒），为 0 时关闭合并
+    embedding_batch_window_ms: int = 10
+    embedding_max_batch_size: int = 64
+    # 多个等价的嵌入上游，逗号分隔；为空时只使用 embedding_api_base
+    embedding_api_bases: str = ""
+    embedding_upstream_max_concurrency: int = 8
+    embedding_hedge_after: float = 1.0
+
+    # 嵌入缓存：内存 LRU + 磁盘向量文件，路径为空时只使用内存层
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "../../embedding_cache"
+    embedding_cache_memory_size: int = 50000
+    embedding_cache_dtype: str = "float16"
 
     llm_model: str = "qwen2.5:7b"
     llm_api_base: str = "http://10.176.64.152:11434/v1/chat/completions"
+    llm_timeout: float = 120.0
+    llm_connect_timeout: float = 5.0
+    llm_max_connections: int = 32
+    # 多个等价的 LLM 上游，逗号分隔；为空时只使用 llm_api_base。
+    # 生成请求占用 GPU 时间长，默认不对冲（hedge_after 为 0）
+    llm_api_bases: str = ""
+    llm_upstream_max_concurrency: int = 4
+    llm_hedge_after: float = 0.0
+
+    # 上游池：没有空闲上游时的等待队列长度与最长等待时间，超出返回 429；
+    # 连续失败 upstream_failure_threshold 次的上游摘除 upstream_eject_seconds 秒
+    upstream_queue_size: int = 64
+    upstream_queue_timeout: float = 30.0
+    upstream_failure_threshold: int = 3
+    upstream_eject_seconds: float = 30.0
+
+    # LLM 响应缓存：chat 与 generate 分别开关；语义匹配默认关闭，按 prompt+context 的嵌入相似度复用
+    llm_cache_size: int = 1024
+    llm_cache_ttl: float = 3600.0
+    llm_cache_chat: bool = True
+    llm_cache_generate: bool = True
+    llm_cache_semantic: bool = False
+    llm_cache_semantic_size: int = 2048
+    llm_cache_semantic_threshold: float = 0.97
+
+    # 词法（BM25）索引与混合检索
+    lexical_index_path: str = "../../lexical_index"
+    hybrid_rrf_k: int = 60
+    hybrid_fetch_factor: int = 4
+    lexical_prefilter_size: int = 1000
+
+    # 查询结果多样化（MMR）：默认多取 mmr_fetch_factor 倍候选，余弦相似度达到阈值的块视为重复
+    mmr_fetch_factor: int = 4
+    mmr_lambda: float = 0.5
+    mmr_dedup_threshold: float = 0.95
+
+    # 查询结果缓存
+    query_cache_size: int = 1024
+    query_cache_ttl: float = 600.0
+
+    # PDF 提取进程数，0 表示使用全部 CPU 核
+    pdf_extract_workers: int = 0
+
+    # 文本分块：以模型 token（CJK 按字）计量，配置 chunk_tokenizer 时使用真实分词器
+    chunk_size_tokens: int = 400
+    chunk_overlap_tokens: int = 50
+    chunk_tokenizer: str = ""
+
+    # 后台入库任务队列
+    ingest_queue_path: str = "../../ingest_jobs.db"
+    ingest_workers: int = 2
+    ingest_poll_interval: float = 5.0
+    # 进行中任务的心跳间隔；心跳超过 ingest_stale_after 秒未更新的任务视为中断，重新排队
+    ingest_heartbeat_interval: float = 10.0
+    ingest_stale_after: float = 60.0
+    # 任务最多被认领的次数，反复中断的任务标记为失败，不再阻塞队列
+    ingest_max_attempts: int = 3
+    # 入库时每批嵌入/写入的块数与同时在途的批数
+    ingest_batch_size: int = 32
+    ingest_max_inflight_batches: int = 4
     
     # class Config:
     #     env_file = ".env"
@@ -1,5 +1,8 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from routers import (
     embedding, 
     vector_db, 
@@ -7,30 +10,91 @@ from routers import (
     document
 )
 from config import settings
+from models.embedding import embedding_client
+from models.llm import llm_client
+from models.vector_db import vector_db as vector_store
+from services.ingest import IngestService
+from services.vector_db import VectorDBService
+from utils.upstream import UpstreamSaturated
 
-app = FastAPI(
-    title="Algorithm Backend API",
-    version="0.1.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
+async def init_vector_store(app: FastAPI):
+    """在后台线程中连接向量库并预热常用集合，期间服务已可接受存活探测；连接失败时定期重试"""
+    while True:
+        try:
+            await asyncio.to_thread(vector_store.initialize)
+            break
+        except Exception as e:
+            print(f"Vector store initialization failed, retrying in 5s: {str(e)}")
+            await asyncio.sleep(5)
+    names = [name.strip() for name in settings.warmup_collections.split(",") if name.strip()]
+    if names:
+        counts = await asyncio.to_thread(VectorDBService.warmup, names)
+        print(f"Warmed up collections: {counts}")
+    app.state.ready = True
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    IngestService.start_workers()
+    init_task = asyncio.create_task(init_vector_store(app))
+    yield
+    init_task.cancel()
+    await IngestService.stop_workers()
+    await embedding_client.close()
+    await llm_client.close()
+
+def create_app() -> FastAPI:
+    app = FastAPI(
+        title="Algorithm Backend API",
+        version="0.1.0",
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan
+    )
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.include_router(embedding.router, prefix="/embedding", tags=["Embedding"])
+    app.include_router(vector_db.router, prefix="/vector-db", tags=["Vector Database"])
+    app.include_router(llm.router, prefix="/llm", tags=["LLM"])
+    app.include_router(document.router, prefix="/document", tags=["Document Processing"])
+
+    @app.exception_handler(UpstreamSaturated)
+    async def upstream_saturated_handler(request: Request, exc: UpstreamSaturated):
+        # 所有上游满载时快速失败，由调用方稍后重试
+        return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/health/live")
+    async def liveness():
+        # 进程能响应即存活，不依赖向量库
+        return {"status": "alive"}
+
+    @app.get("/health/ready")
+    async def readiness(request: Request):
+        # 向量库连接并完成预热后才就绪
+        if request.app.state.ready:
+            return {"status": "ready"}
+        if vector_store.error:
+            return JSONResponse(status_code=503, content={"status": "failed", "detail": vector_store.error})
+        return JSONResponse(status_code=503, content={"status": "starting"})
+
+    @app.get("/health/upstreams")
+    async def upstream_stats():
+        return [llm_client.pool.stats(), embedding_client.pool.stats()]
 
-app.include_router(embedding.router, prefix="/embedding", tags=["Embedding"])
-app.include_router(vector_db.router, prefix="/vector-db", tags=["Vector Database"])
-app.include_router(llm.router, prefix="/llm", tags=["LLM"])
-app.include_router(document.router, prefix="/document", tags=["Document Processing"])
+    return app
 
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
+app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
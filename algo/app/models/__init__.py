@@ -1,6 +1,6 @@
-# from .embedding import EmbeddingModel
+from .embedding import EmbeddingClient
 from .vector_db import VectorDB
-# from .llm import LLMClient
+from .llm import LLMClient
+from .numpy_store import NumpyClient, NumpyCollection
 
-# __all__ = ["EmbeddingModel", "VectorDB", "LLMClient"]
-__all__ = ["VectorDB"]
+__all__ = ["EmbeddingClient", "VectorDB", "LLMClient", "NumpyClient", "NumpyCollection"]
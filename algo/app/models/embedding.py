@@ -0,0 +1,117 @@
+import asyncio
+from typing import List, Optional, Set, Tuple
+import httpx
+from config import settings
+from utils.upstream import UpstreamPool, split_urls
+
+class EmbeddingClient:
+    """嵌入服务的异步客户端：长连接池 + 微批合并，请求经上游池分发到多个等价上游"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.pool = UpstreamPool(
+            "embedding",
+            split_urls(settings.embedding_api_bases, settings.embedding_api_base),
+            max_concurrency=settings.embedding_upstream_max_concurrency,
+            queue_size=settings.upstream_queue_size,
+            queue_timeout=settings.upstream_queue_timeout,
+            hedge_after=settings.embedding_hedge_after,
+            failure_threshold=settings.upstream_failure_threshold,
+            eject_seconds=settings.upstream_eject_seconds
+        )
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_size = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 持有进行中的批次任务的引用，避免任务在执行中被垃圾回收
+        self._batches: Set[asyncio.Task] = set()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.embedding_timeout,
+                    connect=settings.embedding_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.embedding_max_connections,
+                    max_keepalive_connections=settings.embedding_max_connections
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def request(self, texts: List[str]) -> List[List[float]]:
+        """直接请求上游嵌入服务，不经过微批"""
+        async def send(url: str) -> List[List[float]]:
+            response = await self.client.post(
+                url,
+                json={
+                    "input": texts,
+                    "model": settings.embedding_model
+                }
+            )
+            response.raise_for_status()
+            data = sorted(response.json()["data"], key=lambda item: item["index"])
+            return [item["embedding"] for item in data]
+
+        return await self.pool.request(send)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """将请求放入微批窗口，与同一时间窗口内的其他请求合并为一次上游调用"""
+        if not texts:
+            return []
+        if settings.embedding_batch_window_ms <= 0 or len(texts) >= settings.embedding_max_batch_size:
+            return await self.request(texts)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_size += len(texts)
+
+        if self._pending_size >= settings.embedding_max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                settings.embedding_batch_window_ms / 1000,
+                self._flush
+            )
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        self._pending_size = 0
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        texts = [text for item, _ in batch for text in item]
+        try:
+            embeddings = await self.request(texts)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # 按原请求的顺序将结果拆分回去
+        offset = 0
+        for item, future in batch:
+            if not future.done():
+                future.set_result(embeddings[offset:offset + len(item)])
+            offset += len(item)
+
+embedding_client = EmbeddingClient()
@@ -0,0 +1,14 @@
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from utils.embedding_cache import get_embedding_cache
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """为 Chroma 的嵌入函数加一层嵌入缓存"""
+
+    def __init__(self, embedding_func: EmbeddingFunction, model_name: str):
+        self.embedding_func = embedding_func
+        self.cache = get_embedding_cache(model_name)
+
+    def __call__(self, input: Documents) -> Embeddings:
+        if self.cache is None:
+            return self.embedding_func(input)
+        return self.cache.embed_sync(list(input), self.embedding_func)
@@ -0,0 +1,172 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from config import settings
+
+ACTIVE_STATUSES = ("extracting", "embedding")
+
+class JobQueue:
+    """基于 SQLite 的持久化入库任务队列，可由多个进程共同消费
+
+    认领任务时记录所属进程（owner）并定期刷新心跳；只有心跳超时的任务
+    才会被重新放回队列，不影响其他仍在运行的进程。
+    每次认领累加 attempts，反复中断（如解析时使进程崩溃的文件）的任务不再重新排队，标记为失败。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    file_type TEXT NOT NULL,
+                    collection_name TEXT NOT NULL,
+                    file_id TEXT,
+                    mode TEXT NOT NULL DEFAULT 'incremental',
+                    status TEXT NOT NULL,
+                    chunks INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    owner TEXT,
+                    heartbeat_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            # 兼容旧版本创建的队列表
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "file_id" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN file_id TEXT")
+            if "mode" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN mode TEXT NOT NULL DEFAULT 'incremental'")
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            if "attempts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(
+        self,
+        file_path: str,
+        file_type: str,
+        collection_name: str,
+        file_id: Optional[str] = None,
+        mode: str = "incremental"
+    ) -> Dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, file_path, file_type, collection_name, file_id, mode, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, file_path, file_type, collection_name, file_id, mode, now, now)
+            )
+        return self.get(job_id)
+
+    def claim(self) -> Optional[Dict]:
+        """取出最早的排队任务并标记为 extracting
+
+        以带状态条件的 UPDATE 认领，并检查影响的行数：其他进程抢先认领时换下一个任务
+        """
+        with self._lock, self._connect() as conn:
+            while True:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'extracting', owner = ?, heartbeat_at = ?, updated_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ? AND status = 'queued'",
+                    (self.owner, now, now, row["id"])
+                )
+                conn.commit()
+                if cursor.rowcount == 1:
+                    return {
+                        **dict(row),
+                        "status": "extracting",
+                        "owner": self.owner,
+                        "heartbeat_at": now,
+                        "attempts": row["attempts"] + 1
+                    }
+
+    def update(self, job_id: str, status: str, chunks: Optional[int] = None, error: Optional[str] = None):
+        """更新本进程认领的任务；任务已被重新排队并由其他进程认领时不覆盖"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, chunks = COALESCE(?, chunks), error = ?, updated_at = ?, heartbeat_at = ? "
+                "WHERE id = ? AND owner = ?",
+                (status, chunks, error, now, now, job_id, self.owner)
+            )
+
+    def heartbeat(self, job_ids: List[str]):
+        if not job_ids:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND id IN ({','.join('?' * len(job_ids))})",
+                (time.time(), self.owner, *job_ids)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_many(self, job_ids: List[str]) -> List[Dict]:
+        if not job_ids:
+            return []
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE id IN ({','.join('?' * len(job_ids))})",
+                job_ids
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue_stale(self, stale_after: float, max_attempts: int) -> Tuple[int, int]:
+        """把心跳超过 stale_after 秒未更新的进行中任务（所属进程已退出或卡死）重新放回队列；
+        已认领 max_attempts 次的任务标记为失败。返回 (重新排队数, 失败数)
+        """
+        now = time.time()
+        stale = (
+            f"status IN ({','.join('?' * len(ACTIVE_STATUSES))}) "
+            f"AND COALESCE(heartbeat_at, updated_at) < ?"
+        )
+        with self._lock, self._connect() as conn:
+            failed = conn.execute(
+                f"UPDATE jobs SET status = 'failed', owner = NULL, updated_at = ?, "
+                f"error = 'Ingestion was interrupted ' || attempts || ' times' "
+                f"WHERE {stale} AND attempts >= ?",
+                (now, *ACTIVE_STATUSES, now - stale_after, max_attempts)
+            ).rowcount
+            requeued = conn.execute(
+                f"UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? WHERE {stale}",
+                (now, *ACTIVE_STATUSES, now - stale_after)
+            ).rowcount
+        return requeued, failed
+
+job_queue = JobQueue(settings.ingest_queue_path)
@@ -0,0 +1,74 @@
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+from config import settings
+from utils.upstream import UpstreamPool, split_urls
+
+class LLMClient:
+    """OpenAI 兼容接口的异步客户端，复用长连接，请求经上游池分发到多个等价上游"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.pool = UpstreamPool(
+            "llm",
+            split_urls(settings.llm_api_bases, settings.llm_api_base),
+            max_concurrency=settings.llm_upstream_max_concurrency,
+            queue_size=settings.upstream_queue_size,
+            queue_timeout=settings.upstream_queue_timeout,
+            hedge_after=settings.llm_hedge_after,
+            failure_threshold=settings.upstream_failure_threshold,
+            eject_seconds=settings.upstream_eject_seconds
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                # 流式响应下 read 超时是两个数据块之间的最长间隔
+                timeout=httpx.Timeout(
+                    settings.llm_timeout,
+                    connect=settings.llm_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.llm_max_connections,
+                    max_keepalive_connections=settings.llm_max_connections
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        async def send(url: str) -> Dict[str, Any]:
+            response = await self.client.post(url, json=payload)
+            response.raise_for_status()
+            return response.json()
+
+        return await self.pool.request(send)
+
+    async def stream(self, payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """原样转发上游的 SSE 字节流；调用方停止迭代时上游连接随之关闭"""
+        async with self.pool.lease() as url, self.client.stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                yield chunk
+
+    async def stream_deltas(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """解析上游 SSE，逐个产出增量文本"""
+        async with self.pool.lease() as url, self.client.stream("POST", url, json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+llm_client = LLMClient()
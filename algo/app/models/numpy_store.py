@@ -0,0 +1,665 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from models.quantization import load_quantizer, make_quantizer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INCLUDE_DEFAULT = ["documents", "metadatas", "distances"]
+
+def _match_where(metadata: Optional[Dict[str, Any]], where: Optional[Dict[str, Any]]) -> bool:
+    """支持 Chroma where 语法的常用子集：$eq/$ne/$gt/$gte/$lt/$lte/$in/$nin 与 $and/$or"""
+    if not where:
+        return True
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_match_where(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(_match_where(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq" and not value == operand:
+                return False
+            if op == "$ne" and not value != operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+    return True
+
+def _top_k(scores: np.ndarray, k: int):
+    """按行取分数最高的 k 个，返回排好序的 (列号, 分数)"""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+def _match_document(document: Optional[str], where_document: Optional[Dict[str, Any]]) -> bool:
+    if not where_document:
+        return True
+    document = document or ""
+    for key, condition in where_document.items():
+        if key == "$contains" and condition not in document:
+            return False
+        if key == "$not_contains" and condition in document:
+            return False
+        if key == "$and" and not all(_match_document(document, sub) for sub in condition):
+            return False
+        if key == "$or" and not any(_match_document(document, sub) for sub in condition):
+            return False
+    return True
+
+class NumpyCollection:
+    """单个集合：连续的 float32 向量矩阵（memmap）+ 与之逐行对齐的 id/文档/元数据旁路文件
+
+    向量写入前做 L2 归一化，查询时一次矩阵乘法得到所有查询的余弦相似度，
+    返回的 distances 为余弦距离 (1 - cos)。
+
+    开启量化（int8/pq）时常驻内存的只有量化编码，查询先用非对称距离在编码上粗排，
+    再从 memmap 的原始向量中取前 rerank_factor * k 个精排；float32 矩阵只按需读页。
+    量化器的训练与编码在写入后由后台线程完成，编码覆盖全部行之前查询走精确检索。
+
+    多个进程可共享同一目录：写入时持有文件锁并先读入其他进程的写入；读取前比较记录文件的
+    inode 与大小，发现其他进程追加过就读入新增的行，文件被整体替换（删除过）时重新加载。
+    """
+
+    # 乘积量化至少需要这么多向量才训练，少于此数时直接精确检索
+    PQ_MIN_TRAIN = 1024
+
+    def __init__(
+        self,
+        path: Path,
+        name: str,
+        embedding_function: Optional[Callable] = None,
+        quantization: str = "none",
+        pq_subspaces: int = 64,
+        rerank_factor: int = 4
+    ):
+        self.path = path
+        self.name = name
+        self.metadata: Optional[Dict[str, Any]] = None
+        self.embedding_function = embedding_function
+        self.quantization = quantization
+        self.pq_subspaces = pq_subspaces
+        self.rerank_factor = rerank_factor
+        self.on_rename: Optional[Callable[[str, str], None]] = None
+        self._quantizer = None
+        self._codes: Optional[np.ndarray] = None
+        self._fitted_rows = 0
+        self._codes_thread: Optional[threading.Thread] = None
+        # 删除会改变行号，后台编码完成时据此判断结果是否仍然有效
+        self._epoch = 0
+        self._lock = threading.RLock()
+        self._dim: Optional[int] = None
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[Dict[str, Any]]] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._records_offset = 0  # records.jsonl 中已读入的字节数
+        self._records_stat: Optional[Tuple[int, int]] = None  # 读入时记录文件的 (inode, 大小)
+        self._file_lock_depth = 0
+        self._load()
+
+    @property
+    def _vector_path(self) -> Path:
+        return self.path / "vectors.f32"
+
+    @property
+    def _record_path(self) -> Path:
+        return self.path / "records.jsonl"
+
+    def _load(self):
+        self._load_info()
+        self._load_records()
+        self._open_vectors()
+        self._load_codes()
+        self._schedule_codes()
+
+    def _load_info(self):
+        info_path = self.path / "collection.json"
+        if info_path.exists():
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            self.metadata = info.get("metadata")
+            self._dim = info.get("dim")
+            self._fitted_rows = info.get("fitted_rows", 0)
+
+    def _records_file_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = self._record_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的互斥锁，没有 fcntl 的平台上退化为只在进程内互斥；
+        同一线程内可重入（upsert 内部调用 delete），调用方需持有 self._lock
+        """
+        if self._file_lock_depth:
+            self._file_lock_depth += 1
+            try:
+                yield
+            finally:
+                self._file_lock_depth -= 1
+            return
+        with open(self.path / "lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            self._file_lock_depth = 1
+            try:
+                yield
+            finally:
+                self._file_lock_depth = 0
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _sync(self):
+        """读入其他进程的写入；调用方需持有 self._lock 与文件锁"""
+        stat = self._records_file_stat()
+        if stat == self._records_stat:
+            return
+        if stat is None or self._records_stat is None or stat[0] != self._records_stat[0] or stat[1] < self._records_offset:
+            # 记录文件被整体替换：全部重新加载，进行中的后台编码作废
+            self._epoch += 1
+            self._quantizer = None
+            self._codes = None
+            self._ids, self._rows, self._documents, self._metadatas = [], {}, [], []
+            self._records_offset = 0
+            self._load()
+            return
+        if self._dim is None:
+            self._load_info()
+        self._load_records()
+        self._open_vectors()
+        self._schedule_codes()
+
+    def _refresh(self):
+        """读取前调用：记录文件与上次读入时不同（其他进程写过）时加文件锁同步；调用方需持有 self._lock"""
+        if self._records_file_stat() != self._records_stat:
+            with self._file_lock():
+                self._sync()
+
+    def _load_records(self):
+        """从上次读到的位置读入记录并与向量文件对齐：写入中断留下的半行记录或多余的向量被截掉，
+        两个文件都截断到一致的行数，保证后续追加的第 i 条记录仍对应第 i 个向量
+        """
+        if not self._record_path.exists():
+            return
+        row_bytes = (self._dim or 0) * 4
+        if not row_bytes:
+            n_vectors = float("inf")  # 维度未知时无法对齐，只丢弃不完整的记录
+        else:
+            n_vectors = self._vector_path.stat().st_size // row_bytes if self._vector_path.exists() else 0
+        offset = self._records_offset
+        with open(self._record_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if len(self._ids) >= n_vectors or not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                offset += len(line)
+                self._rows[record["id"]] = len(self._ids)
+                self._ids.append(record["id"])
+                self._documents.append(record.get("document"))
+                self._metadatas.append(record.get("metadata"))
+        if self._record_path.stat().st_size > offset:
+            print(f"Truncating torn records of collection {self.name}")
+            with open(self._record_path, "r+b") as f:
+                f.truncate(offset)
+        if row_bytes and self._vector_path.exists() and self._vector_path.stat().st_size > len(self._ids) * row_bytes:
+            print(f"Truncating orphaned vectors of collection {self.name}")
+            with open(self._vector_path, "r+b") as f:
+                f.truncate(len(self._ids) * row_bytes)
+        self._records_offset = offset
+        self._records_stat = self._records_file_stat()
+
+    def _load_codes(self):
+        quantizer_path = self.path / "quantizer.npz"
+        codes_path = self.path / "codes.npy"
+        if self.quantization == "none" or not quantizer_path.exists():
+            return
+        quantizer = load_quantizer(quantizer_path)
+        if quantizer.kind != self.quantization:
+            return
+        self._quantizer = quantizer
+        if codes_path.exists():
+            codes = np.load(codes_path)
+            # 编码行数少于向量行数时（上次写入后尚未编码完），缺的部分由后台线程补齐
+            self._codes = codes if len(codes) <= len(self._ids) else None
+
+    def _codes_ready(self) -> Optional[np.ndarray]:
+        """编码覆盖全部行时返回编码，否则返回 None（查询改走精确检索）"""
+        if self._codes is not None and self._quantizer is not None and len(self._codes) == len(self._ids):
+            return self._codes
+        return None
+
+    def _needs_fit(self, n: int) -> bool:
+        # 首次训练，或集合规模翻倍后重新训练
+        return self._quantizer is None or n >= 2 * self._fitted_rows
+
+    def _schedule_codes(self):
+        """需要训练或补编码时启动后台线程；调用方需持有锁或处于初始化中"""
+        if self.quantization == "none" or self._vectors is None:
+            return
+        if self.quantization == "pq" and len(self._ids) < self.PQ_MIN_TRAIN:
+            return
+        if self._codes_ready() is not None and not self._needs_fit(len(self._ids)):
+            return
+        if self._codes_thread is not None and self._codes_thread.is_alive():
+            return
+        self._codes_thread = threading.Thread(target=self._build_codes, name=f"codes-{self.name}", daemon=True)
+        self._codes_thread.start()
+
+    def wait_for_codes(self, timeout: Optional[float] = None):
+        """等待后台编码完成（用于测试与基准）"""
+        thread = self._codes_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _build_codes(self):
+        """在锁外训练量化器并编码，完成后在锁内提交；期间有删除则重做，有追加则继续补齐"""
+        try:
+            while True:
+                with self._lock:
+                    n = len(self._ids)
+                    vectors = self._vectors
+                    epoch = self._epoch
+                    fit = self._needs_fit(n)
+                    quantizer = self._quantizer
+                    codes = None if fit else self._codes
+                    if vectors is None or (not fit and codes is not None and len(codes) == n):
+                        return
+                if fit:
+                    quantizer = make_quantizer(self.quantization, self.pq_subspaces)
+                    quantizer.fit(np.asarray(vectors[:n]))
+                start = 0 if codes is None else len(codes)
+                new_codes = quantizer.encode(np.asarray(vectors[start:n]))
+                codes = new_codes if start == 0 else np.concatenate([codes, new_codes])
+                with self._lock:
+                    if self._epoch != epoch:
+                        continue
+                    self._quantizer = quantizer
+                    self._codes = codes
+                    if fit:
+                        self._fitted_rows = n
+                        quantizer.save(self.path / "quantizer.npz")
+                        self._save_info()
+                    np.save(self.path / "codes.npy", codes)
+        except Exception as e:
+            print(f"Building quantization codes for {self.name} failed: {str(e)}")
+
+    def _save_info(self):
+        with open(self.path / "collection.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "name": self.name,
+                "metadata": self.metadata,
+                "dim": self._dim,
+                "fitted_rows": self._fitted_rows
+            }, f)
+
+    def _open_vectors(self):
+        if self._dim and self._ids:
+            self._vectors = np.memmap(self._vector_path, dtype=np.float32, mode="r", shape=(len(self._ids), self._dim))
+        else:
+            self._vectors = None
+
+    def _embed(self, documents: List[str]) -> np.ndarray:
+        if self.embedding_function is None:
+            raise ValueError("No embedding function configured for this collection")
+        return np.asarray(self.embedding_function(list(documents)), dtype=np.float32)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            if metadata is not None:
+                self.metadata = metadata
+            if name and name != self.name:
+                new_path = self.path.parent / name
+                if new_path.exists():
+                    raise ValueError(f"Collection {name} already exists")
+                self._vectors = None
+                os.rename(self.path, new_path)
+                self.path = new_path
+                old_name, self.name = self.name, name
+                self._open_vectors()
+                if self.on_rename is not None:
+                    self.on_rename(old_name, name)
+            self._save_info()
+
+    def add(
+        self,
+        ids: List[str],
+        documents: Optional[List[str]] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        """与 Chroma 一致，已存在的 id 会被忽略"""
+        with self._lock, self._file_lock():
+            self._sync()
+            keep = [i for i, id_ in enumerate(ids) if id_ not in self._rows]
+            if len(keep) < len(ids):
+                print(f"Skipping {len(ids) - len(keep)} existing ids in {self.name}")
+            if not keep:
+                return
+            self._append(
+                [ids[i] for i in keep],
+                [documents[i] for i in keep] if documents is not None else None,
+                [embeddings[i] for i in keep] if embeddings is not None else None,
+                [metadatas[i] for i in keep] if metadatas is not None else None
+            )
+
+    def upsert(
+        self,
+        ids: List[str],
+        documents: Optional[List[str]] = None,
+        embeddings: Optional[List[List[float]]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ):
+        with self._lock, self._file_lock():
+            self._sync()
+            existing = [id_ for id_ in ids if id_ in self._rows]
+            if existing:
+                self.delete(ids=existing)
+            self._append(ids, documents, embeddings, metadatas)
+
+    def _append(self, ids, documents, embeddings, metadatas):
+        if embeddings is None:
+            if documents is None:
+                raise ValueError("Either documents or embeddings must be provided")
+            vectors = self._embed(documents)
+        else:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+            self._save_info()
+        if vectors.shape[1] != self._dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self._dim}")
+        vectors = self._normalize(vectors)
+
+        # 先写向量、最后写记录：中断时只会留下多余的向量，加载时按记录数截断
+        with open(self._vector_path, "ab") as f:
+            offset = len(self._ids) * self._dim * 4
+            if f.tell() != offset:
+                # 之前的写入失败留下了多余的字节
+                f.truncate(offset)
+            f.write(vectors.tobytes())
+        lines = []
+        with open(self._record_path, "ab") as f:
+            for i, id_ in enumerate(ids):
+                record = {
+                    "id": id_,
+                    "document": documents[i] if documents is not None else None,
+                    "metadata": metadatas[i] if metadatas is not None else None
+                }
+                lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+                self._rows[id_] = len(self._ids)
+                self._ids.append(id_)
+                self._documents.append(record["document"])
+                self._metadatas.append(record["metadata"])
+            data = "".join(lines).encode("utf-8")
+            f.write(data)
+        self._records_offset += len(data)
+        self._records_stat = self._records_file_stat()
+        self._open_vectors()
+        self._schedule_codes()
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """删除后压缩重写向量文件与旁路文件"""
+        with self._lock, self._file_lock():
+            self._sync()
+            drop = set(ids or [])
+            if where:
+                drop.update(id_ for id_, metadata in zip(self._ids, self._metadatas) if _match_where(metadata, where))
+            keep = [row for row, id_ in enumerate(self._ids) if id_ not in drop]
+            if len(keep) == len(self._ids):
+                return
+            vectors = np.array(self._vectors[keep]) if self._vectors is not None else np.zeros((0, self._dim or 0), np.float32)
+            self._ids = [self._ids[row] for row in keep]
+            self._documents = [self._documents[row] for row in keep]
+            self._metadatas = [self._metadatas[row] for row in keep]
+            self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+            self._vectors = None
+            # 行号已变化，由后台线程用现有量化器重新编码
+            self._epoch += 1
+            self._codes = None
+            if (self.path / "codes.npy").exists():
+                os.remove(self.path / "codes.npy")
+
+            tmp_vectors = self._vector_path.with_suffix(".tmp")
+            tmp_records = self._record_path.with_suffix(".tmp")
+            with open(tmp_vectors, "wb") as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            with open(tmp_records, "w", encoding="utf-8") as f:
+                for id_, document, metadata in zip(self._ids, self._documents, self._metadatas):
+                    f.write(json.dumps({"id": id_, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n")
+            os.replace(tmp_vectors, self._vector_path)
+            os.replace(tmp_records, self._record_path)
+            self._records_offset = self._record_path.stat().st_size
+            self._records_stat = self._records_file_stat()
+            self._open_vectors()
+            self._schedule_codes()
+
+    def _candidate_rows(
+        self,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        ids: Optional[List[str]] = None
+    ) -> Optional[np.ndarray]:
+        """返回满足过滤条件的行号；无过滤条件时返回 None 表示全部"""
+        if not where and not where_document and ids is None:
+            return None
+        rows = range(len(self._ids)) if ids is None else [self._rows[id_] for id_ in ids if id_ in self._rows]
+        return np.array([
+            row for row in rows
+            if _match_where(self._metadatas[row], where) and _match_document(self._documents[row], where_document)
+        ], dtype=np.int64)
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            self._refresh()
+            rows = self._candidate_rows(where, where_document, ids)
+            rows = list(range(len(self._ids))) if rows is None else rows.tolist()
+            rows = rows[offset or 0:(offset or 0) + limit if limit is not None else None]
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows] if "documents" in include else None,
+                "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+                "embeddings": np.array(self._vectors[rows]) if "embeddings" in include and self._vectors is not None else None
+            }
+
+    def query(
+        self,
+        query_texts: Optional[List[str]] = None,
+        query_embeddings: Optional[List[List[float]]] = None,
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        where_document: Optional[Dict[str, Any]] = None,
+        include: Optional[List[str]] = None,
+        ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """批量查询：所有查询向量与候选矩阵一次相乘，再用 argpartition 取 top-k"""
+        include = INCLUDE_DEFAULT if include is None else include
+        if query_embeddings is None:
+            queries = self._embed(query_texts)
+        else:
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = self._normalize(queries)
+
+        with self._lock:
+            self._refresh()
+            vectors = self._vectors
+            rows = self._candidate_rows(where, where_document, ids)
+            n_queries = queries.shape[0]
+            n_candidates = len(self._ids) if rows is None else len(rows)
+            k = min(n_results, n_candidates)
+            # 没有候选或 n_results 为 0 时直接返回空结果，量化路径的 reshape 不能处理 k = 0
+            if vectors is None or k <= 0:
+                empty = [[] for _ in range(n_queries)]
+                return {
+                    "ids": empty,
+                    "documents": empty if "documents" in include else None,
+                    "metadatas": empty if "metadatas" in include else None,
+                    "distances": empty if "distances" in include else None,
+                    "embeddings": empty if "embeddings" in include else None
+                }
+            codes = self._codes_ready()
+            if codes is None:
+                candidates = vectors if rows is None else vectors[rows]
+                scores = queries @ np.asarray(candidates).T  # (n_queries, n_candidates)
+                top, top_scores = _top_k(scores, k)
+                top_rows = top if rows is None else rows[top]
+            else:
+                scores = self._quantizer.scores(queries, codes if rows is None else codes[rows])
+                n_rerank = min(k * self.rerank_factor, n_candidates) if self.rerank_factor > 0 else k
+                top, top_scores = _top_k(scores, n_rerank)
+                top_rows = top if rows is None else rows[top]
+                if self.rerank_factor > 0:
+                    # 用原始向量对粗排结果精排
+                    exact = np.einsum(
+                        "qd,qkd->qk",
+                        queries,
+                        np.asarray(vectors[top_rows.ravel()]).reshape(*top_rows.shape, -1)
+                    )
+                    top, top_scores = _top_k(exact, k)
+                    top_rows = np.take_along_axis(top_rows, top, axis=1)
+
+            result_rows = top_rows.tolist()
+            return {
+                "ids": [[self._ids[row] for row in line] for line in result_rows],
+                "documents": [[self._documents[row] for row in line] for line in result_rows] if "documents" in include else None,
+                "metadatas": [[self._metadatas[row] for row in line] for line in result_rows] if "metadatas" in include else None,
+                "distances": (1 - top_scores).tolist() if "distances" in include else None,
+                "embeddings": [np.array(vectors[line]) for line in result_rows] if "embeddings" in include else None
+            }
+
+class NumpyClient:
+    """与 Chroma 客户端接口一致的进程内向量库，每个集合一个目录"""
+
+    def __init__(self, path: str, quantization: str = "none", pq_subspaces: int = 64, rerank_factor: int = 4):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.quantization = quantization
+        self.pq_subspaces = pq_subspaces
+        self.rerank_factor = rerank_factor
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def heartbeat(self) -> int:
+        return time.time_ns()
+
+    def list_collections(self) -> List[str]:
+        return sorted(p.name for p in self.path.iterdir() if (p / "collection.json").exists())
+
+    def _open(self, name: str, embedding_function: Optional[Callable]) -> NumpyCollection:
+        collection = self._collections.get(name)
+        if collection is None or collection.name != name:
+            collection = NumpyCollection(
+                self.path / name,
+                name,
+                embedding_function,
+                quantization=self.quantization,
+                pq_subspaces=self.pq_subspaces,
+                rerank_factor=self.rerank_factor
+            )
+            collection.on_rename = self._renamed
+            self._collections[name] = collection
+        collection.embedding_function = embedding_function or collection.embedding_function
+        return collection
+
+    def _renamed(self, old_name: str, new_name: str):
+        """集合改名后按新名字登记，旧名字不再指向它"""
+        with self._lock:
+            collection = self._collections.pop(old_name, None)
+            if collection is not None:
+                self._collections[new_name] = collection
+
+    def get_collection(self, name: str, embedding_function: Optional[Callable] = None) -> NumpyCollection:
+        with self._lock:
+            if not (self.path / name / "collection.json").exists():
+                raise ValueError(f"Collection {name} does not exist")
+            return self._open(name, embedding_function)
+
+    def create_collection(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding_function: Optional[Callable] = None
+    ) -> NumpyCollection:
+        with self._lock:
+            if (self.path / name / "collection.json").exists():
+                raise ValueError(f"Collection {name} already exists")
+            (self.path / name).mkdir(parents=True, exist_ok=True)
+            collection = self._open(name, embedding_function)
+            collection.metadata = metadata
+            collection._save_info()
+            return collection
+
+    def get_or_create_collection(
+        self,
+        name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        embedding_function: Optional[Callable] = None
+    ) -> NumpyCollection:
+        try:
+            return self.get_collection(name, embedding_function)
+        except ValueError:
+            return self.create_collection(name, metadata, embedding_function)
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            if not (self.path / name).exists():
+                raise ValueError(f"Collection {name} does not exist")
+            self._collections.pop(name, None)
+            shutil.rmtree(self.path / name)
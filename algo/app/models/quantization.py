@@ -0,0 +1,148 @@
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+
+class ScalarQuantizer:
+    """逐维 int8 标量量化：x ≈ low + scale * code，code ∈ [0, 255]
+
+    查询向量保持 float32（非对称距离）：q·x ≈ q·low + (q * scale)·code
+    """
+
+    kind = "int8"
+
+    def __init__(self):
+        self.low: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    def fit(self, vectors: np.ndarray) -> "ScalarQuantizer":
+        self.low = vectors.min(axis=0).astype(np.float32)
+        high = vectors.max(axis=0).astype(np.float32)
+        self.scale = np.maximum(high - self.low, 1e-12) / 255
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return self.low + codes.astype(np.float32) * self.scale
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """返回 (n_queries, n_codes) 的近似内积"""
+        bias = queries @ self.low
+        return (queries * self.scale) @ codes.T.astype(np.float32) + bias[:, None]
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return dim
+
+    def save(self, path: Union[str, Path]):
+        np.savez(path, kind=self.kind, low=self.low, scale=self.scale)
+
+    @classmethod
+    def from_npz(cls, data) -> "ScalarQuantizer":
+        quantizer = cls()
+        quantizer.low = data["low"]
+        quantizer.scale = data["scale"]
+        return quantizer
+
+class ProductQuantizer:
+    """乘积量化：向量切成 m 个子空间，每个子空间用 256 个中心点编码为 1 字节
+
+    查询时先算出每个子空间到各中心点的内积查找表，再按编码查表求和（ADC）。
+    """
+
+    kind = "pq"
+
+    def __init__(self, n_subspaces: int = 64, n_centroids: int = 256, n_iter: int = 15, seed: int = 0):
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None  # (m, ks, dsub)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        n, dim = vectors.shape
+        return vectors.reshape(n, self.n_subspaces, dim // self.n_subspaces)
+
+    @staticmethod
+    def _assign(sub: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        # argmin ||x - c||^2 = argmin (||c||^2 - 2 x·c)
+        distances = (centroids ** 2).sum(axis=1)[None, :] - 2 * sub @ centroids.T
+        return distances.argmin(axis=1)
+
+    def fit(self, vectors: np.ndarray, max_train: int = 20000) -> "ProductQuantizer":
+        dim = vectors.shape[1]
+        if dim % self.n_subspaces:
+            raise ValueError(f"Dimension {dim} is not divisible by {self.n_subspaces} subspaces")
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > max_train:
+            vectors = vectors[rng.choice(len(vectors), max_train, replace=False)]
+        vectors = np.asarray(vectors, dtype=np.float32)
+        subs = self._split(vectors)
+        ks = min(self.n_centroids, len(vectors))
+        self.centroids = np.zeros((self.n_subspaces, self.n_centroids, dim // self.n_subspaces), np.float32)
+        for j in range(self.n_subspaces):
+            sub = subs[:, j, :]
+            centroids = sub[rng.choice(len(sub), ks, replace=False)].copy()
+            for _ in range(self.n_iter):
+                labels = self._assign(sub, centroids)
+                counts = np.bincount(labels, minlength=ks)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sub)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            self.centroids[j, :ks] = centroids
+            if ks < self.n_centroids:
+                # 训练样本不足时，多余的中心点复制已有中心点，保证编码合法
+                self.centroids[j, ks:] = centroids[0]
+        return self
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        subs = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.n_subspaces), dtype=np.uint8)
+        for j in range(self.n_subspaces):
+            codes[:, j] = self._assign(subs[:, j, :], self.centroids[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = [self.centroids[j][codes[:, j]] for j in range(self.n_subspaces)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        """返回 (n_queries, n_codes) 的近似内积"""
+        # 查找表 (n_queries, m, ks)
+        tables = np.einsum("qmd,mkd->qmk", self._split(queries.astype(np.float32)), self.centroids)
+        columns = np.ascontiguousarray(codes.T)
+        result = np.zeros((len(queries), len(codes)), dtype=np.float32)
+        for j in range(self.n_subspaces):
+            result += np.take(tables[:, j, :], columns[j], axis=1)
+        return result
+
+    def bytes_per_vector(self, dim: int) -> int:
+        return self.n_subspaces
+
+    def save(self, path: Union[str, Path]):
+        np.savez(path, kind=self.kind, centroids=self.centroids)
+
+    @classmethod
+    def from_npz(cls, data) -> "ProductQuantizer":
+        centroids = data["centroids"]
+        quantizer = cls(n_subspaces=centroids.shape[0], n_centroids=centroids.shape[1])
+        quantizer.centroids = centroids
+        return quantizer
+
+def make_quantizer(mode: str, pq_subspaces: int = 64):
+    if mode == "int8":
+        return ScalarQuantizer()
+    if mode == "pq":
+        return ProductQuantizer(n_subspaces=pq_subspaces)
+    return None
+
+def load_quantizer(path: Union[str, Path]):
+    with np.load(path) as data:
+        kind = str(data["kind"])
+        if kind == "int8":
+            return ScalarQuantizer.from_npz(data)
+        if kind == "pq":
+            return ProductQuantizer.from_npz(data)
+    raise ValueError(f"Unknown quantizer kind: {kind}")
@@ -1,11 +1,30 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import threading
+from typing import Any, Dict, Optional
 from config import settings
+from utils.bm25 import lexical_index
+from models.numpy_store import NumpyClient, NumpyCollection
 
 class VectorDB:
     def __init__(self):
+        # chromadb 导入较慢，推迟到真正创建客户端时
+        import chromadb
+        from chromadb.utils import embedding_functions
+        from models.embedding_function import CachedEmbeddingFunction
+
+        # 进程内的集合句柄缓存，删除或重命名集合时失效
+        self._collections: Dict[str, Any] = {}
+        # 每个集合的写入代数，写入后递增，使查询缓存中的旧结果失效
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
         try:
-            if settings.chroma_path:
+            if settings.vector_backend == "numpy":
+                self.client = NumpyClient(
+                    settings.numpy_store_path,
+                    quantization=settings.numpy_quantization,
+                    pq_subspaces=settings.numpy_pq_subspaces,
+                    rerank_factor=settings.numpy_rerank_factor
+                )
+            elif settings.chroma_path:
                 self.client = chromadb.PersistentClient(path=settings.chroma_path)
             else:
                 self.client = chromadb.HttpClient(
@@ -14,9 +33,12 @@ class VectorDB:
                     settings=chromadb.Settings(anonymized_telemetry=False)
                 )
             
-            self.embedding_func = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=settings.query_api_key,
-                api_base=settings.query_api_base,
+            self.embedding_func = CachedEmbeddingFunction(
+                embedding_functions.OpenAIEmbeddingFunction(
+                    api_key=settings.query_api_key,
+                    api_base=settings.query_api_base,
+                    model_name=settings.query_model
+                ),
                 model_name=settings.query_model
             )
             # test the connection
@@ -26,17 +48,106 @@ class VectorDB:
             raise ConnectionError(f"Failed to connect to ChromaDB: {str(e)}")
     
     def get_collection(self, name: str):
-        print(f"getting collection: {name}")
-        return self.client.get_collection(
-            name=name,
-            embedding_function=self.embedding_func
-        )
+        collection = self._collections.get(name)
+        if collection is None:
+            print(f"getting collection: {name}")
+            collection = self.client.get_collection(
+                name=name,
+                embedding_function=self.embedding_func
+            )
+            with self._lock:
+                self._collections[name] = collection
+        return collection
     
-    def create_collection(self, name: str):
+    def create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
         print("createing collection")
-        return self.client.create_collection(
+        collection = self.client.create_collection(
             name=name,
+            metadata=metadata,
             embedding_function=self.embedding_func
         )
+        with self._lock:
+            self._collections[name] = collection
+        return collection
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata=metadata,
+                embedding_function=self.embedding_func
+            )
+            with self._lock:
+                self._collections[name] = collection
+        return collection
+
+    def delete_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
+        self.client.delete_collection(name=name)
+        lexical_index.drop(name)
+        self.bump_generation(name)
+
+    def update_collection(self, name: str, new_name: Optional[str] = None, new_metadata: Optional[Dict[str, Any]] = None):
+        collection = self.get_collection(name)
+        with self._lock:
+            self._collections.pop(name, None)
+        collection.modify(name=new_name, metadata=new_metadata)
+        self.bump_generation(name)
+        if new_name:
+            lexical_index.rename(name, new_name)
+            self.bump_generation(new_name)
+        return collection
+
+    @staticmethod
+    def distance_space(collection) -> str:
+        """集合使用的距离度量：numpy 后端固定为余弦，Chroma 默认为 l2"""
+        if isinstance(collection, NumpyCollection):
+            return "cosine"
+        return (collection.metadata or {}).get("hnsw:space", "l2")
+
+    def generation(self, name: str) -> int:
+        return self._generations.get(name, 0)
+
+    def bump_generation(self, name: str):
+        """集合中的文档被增删改后调用"""
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def invalidate(self, name: Optional[str] = None):
+        """清除集合句柄缓存，name 为空时全部清除"""
+        with self._lock:
+            if name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(name, None)
+
+class LazyVectorDB:
+    """VectorDB 的延迟代理：首次访问属性时才创建客户端，也可在启动时于后台线程中提前初始化"""
+
+    def __init__(self):
+        self._instance: Optional[VectorDB] = None
+        self._lock = threading.Lock()
+        self.error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    def initialize(self) -> VectorDB:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    try:
+                        self._instance = VectorDB()
+                    except Exception as e:
+                        self.error = str(e)
+                        raise
+                    self.error = None
+        return self._instance
+
+    def __getattr__(self, name: str):
+        return getattr(self.initialize(), name)
 
-vector_db = VectorDB()
+vector_db = LazyVectorDB()
@@ -3,8 +3,9 @@ from schemas.base import StandardResponse
 from services.document import DocumentService
 import os
 from datetime import datetime
-from typing import Dict
-from schemas.document import ProcessLocalFileRequest
+from typing import Dict, List
+from schemas.document import ProcessLocalFileRequest, IngestJobResponse, JobStatusRequest
+from services.ingest import IngestService
 from pathlib import Path
 
 router = APIRouter()
@@ -25,7 +26,7 @@ router = APIRouter()
 #             f.write(content)
         
 #         # 处理文件
-#         result = DocumentService.process_uploaded_file(
+#         result = await DocumentService.process_uploaded_file(
 #             file_path=file_path,
 #             file_type=file.content_type,
 #             collection_name=collection_name
@@ -50,10 +51,12 @@ async def process_local_file(request: ProcessLocalFileRequest):
             raise HTTPException(status_code=404, detail="File not found")
         
         # 处理文件
-        result = DocumentService.process_uploaded_file(
+        result = await DocumentService.process_uploaded_file(
             file_path=str(file_path),
             file_type=request.file_type,
-            collection_name=request.collection_name
+            collection_name=request.collection_name,
+            file_id=request.file_id,
+            mode=request.mode.value
         )
         
         print(result)
@@ -62,3 +65,29 @@ async def process_local_file(request: ProcessLocalFileRequest):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/jobs", response_model=IngestJobResponse)
+async def enqueue_file(request: ProcessLocalFileRequest):
+    """将文件加入后台入库队列，立即返回任务信息"""
+    file_path = Path("../../uploads") / request.file_path
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    return IngestService.enqueue(
+        file_path=str(file_path),
+        file_type=request.file_type.value,
+        collection_name=request.collection_name,
+        file_id=request.file_id,
+        mode=request.mode.value
+    )
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_job(job_id: str):
+    job = IngestService.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/status", response_model=List[IngestJobResponse])
+async def get_jobs(request: JobStatusRequest):
+    return IngestService.get_jobs(request.ids)
@@ -6,4 +6,8 @@ router = APIRouter()
 
 @router.post("/", response_model=EmbeddingResponse)
 async def get_embeddings(request: EmbeddingRequest):
-    return EmbeddingService.get_embeddings(request.input)
+    return await EmbeddingService.get_embeddings(request.input)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return EmbeddingService.cache_stats()
@@ -1,37 +1,81 @@
+import json
+from typing import AsyncIterator
 from fastapi import APIRouter
 from fastapi.responses import StreamingResponse
 from schemas.llm import (
     ChatCompletionRequest,
     ChatCompletionResponse,
     ContentGenerationRequest,
-    ContentGenerationResponse,
-    Message
+    ContentGenerationResponse
 )
 from services.llm import LLMService
+from utils.singleflight import single_flight
 
 router = APIRouter()
 
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # 关闭反向代理的缓冲，保证首个 token 立即到达客户端
+    "X-Accel-Buffering": "no"
+}
+
+async def primed(generator: AsyncIterator) -> AsyncIterator:
+    """先取出第一块再开始响应，使排队满载（429）等上游错误能以状态码返回，而不是中断的流"""
+    try:
+        first = await generator.__anext__()
+    except StopAsyncIteration:
+        return generator
+
+    async def chained():
+        try:
+            yield first
+            async for chunk in generator:
+                yield chunk
+        finally:
+            await generator.aclose()
+
+    return chained()
+
 @router.post("/chat", response_model=ChatCompletionResponse)
 async def chat_completion(request: ChatCompletionRequest):
-    messages = [
-        Message(role="system", content="你是一个乐于助人的AI助手。请用简洁明了的语言回答用户的问题。"),
-    ] + request.messages
-    
-    response = LLMService.chat_completion(messages)
+    messages = LLMService.chat_messages(request.messages)
+    response = await LLMService.chat_completion(messages, use_cache=request.cache)
     return response
 
 @router.post("/chat/stream")
 async def chat_completion_stream(request: ChatCompletionRequest):
-    generator = LLMService.chat_completion(request.messages, stream=True)
-    return StreamingResponse(generator, media_type="text/event-stream")
+    generator = await primed(LLMService.chat_completion_stream(LLMService.chat_messages(request.messages)))
+    return StreamingResponse(generator, media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.post("/generate", response_model=ContentGenerationResponse)
 async def generate_content(request: ContentGenerationRequest):
-    content = LLMService.generate_review_content(
-        prompt=request.prompt,
-        context=request.context or ""
+    # 相同内容的并发请求（重复点击、前端重试）共享同一次生成
+    content = await single_flight.do(
+        single_flight.key("llm/generate", request.dict()),
+        lambda: LLMService.generate_review_content(
+            prompt=request.prompt,
+            context=request.context or "",
+            use_cache=request.cache
+        )
     )
     return {
         "content": content,
         # "type": request.prompt.get("type", "paragraph")
     }
+
+@router.post("/generate/stream")
+async def generate_content_stream(request: ContentGenerationRequest):
+    async def event_stream():
+        async for delta in LLMService.generate_review_content_stream(
+            prompt=request.prompt,
+            context=request.context or "",
+            use_cache=request.cache
+        ):
+            yield f"data: {json.dumps({'content': delta}, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(await primed(event_stream()), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return LLMService.cache_stats()
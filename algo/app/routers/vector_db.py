@@ -1,16 +1,37 @@
+import asyncio
 from fastapi import APIRouter
 from schemas.vector_db import (
     CollectionCreateRequest,
     DocumentAddRequest,
-    QueryRequest
+    DocumentDeleteRequest,
+    QueryRequest,
+    UpdateCollectionRequest,
+    DeleteCollectionResponse
 )
 from services.vector_db import VectorDBService
+from utils.singleflight import single_flight
 
 router = APIRouter()
 
-# @router.post("/collections")
-# async def create_collection(request: CollectionCreateRequest):
-#     return VectorDBService.create_collection(request.name)
+@router.post("/collections")
+async def create_collection(request: CollectionCreateRequest):
+    return VectorDBService.create_collection(
+        request.name,
+        request.metadata,
+        request.get_or_create
+    )
+
+@router.put("/collections")
+async def update_collection(request: UpdateCollectionRequest):
+    return VectorDBService.update_collection(
+        request.collection_name,
+        request.new_name,
+        request.new_metadata
+    )
+
+@router.delete("/collections/{collection_name}", response_model=DeleteCollectionResponse)
+async def delete_collection(collection_name: str):
+    return VectorDBService.delete_collection(collection_name)
 
 @router.post("/documents")
 async def add_documents(request: DocumentAddRequest):
@@ -18,14 +39,42 @@ async def add_documents(request: DocumentAddRequest):
         request.collection_name,
         request.documents,
         request.ids,
-        request.metadatas
+        request.metadatas,
+        request.embeddings
     )
 
-@router.post("/query")
-async def query_documents(request: QueryRequest):
-    return VectorDBService.query(
+@router.post("/documents/delete")
+async def delete_documents(request: DocumentDeleteRequest):
+    # 删除会重写存储文件并更新词法索引，放到线程中执行
+    return await asyncio.to_thread(
+        VectorDBService.delete_documents,
         request.collection_name,
-        request.query_texts,
-        request.n_results,
+        request.ids,
         request.where
     )
+
+@router.post("/query")
+async def query_documents(request: QueryRequest):
+    # 相同内容的并发查询共享同一次检索；检索本身是同步调用，放到线程中执行
+    return await single_flight.do(
+        single_flight.key("vector-db/query", request.dict()),
+        lambda: asyncio.to_thread(
+            VectorDBService.query,
+            request.collection_name,
+            request.query_texts,
+            request.n_results,
+            request.where,
+            request.where_document,
+            request.mode.value,
+            request.prefilter,
+            request.diversify,
+            request.fetch_k,
+            request.mmr_lambda,
+            request.dedup_threshold,
+            request.query_embeddings
+        )
+    )
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return dict(VectorDBService.cache_stats(), single_flight=single_flight.stats())
@@ -8,6 +8,7 @@ from .vector_db import (
     CollectionCreateRequest,
     CollectionInfoResponse,
     DocumentAddRequest,
+    QueryMode,
     QueryRequest,
     QueryResponse
 )
@@ -18,7 +19,14 @@ from .llm import (
     ContentGenerationRequest
 )
 
-from .document import ProcessLocalFileRequest, FileType
+from .document import (
+    ProcessLocalFileRequest,
+    FileType,
+    IngestMode,
+    JobStatus,
+    IngestJobResponse,
+    JobStatusRequest
+)
 
 __all__ = [
     "StandardResponse",
@@ -28,6 +36,7 @@ __all__ = [
     "CollectionCreateRequest",
     "CollectionInfoResponse",
     "DocumentAddRequest",
+    "QueryMode",
     "QueryRequest",
     "QueryResponse",
     "Message",
@@ -35,5 +44,9 @@ __all__ = [
     "ChatCompletionResponse",
     "ContentGenerationRequest",
     "ProcessLocalFileRequest",
-    "FileType"
+    "FileType",
+    "IngestMode",
+    "JobStatus",
+    "IngestJobResponse",
+    "JobStatusRequest"
 ]
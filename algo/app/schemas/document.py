@@ -1,12 +1,39 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from enum import Enum
 
 class FileType(str, Enum):
     PDF = "application/pdf"
     LATEX_ZIP = "application/zip"
 
+class IngestMode(str, Enum):
+    INCREMENTAL = "incremental"  # 只写入新增的块，删除过期的块
+    FULL = "full"  # 删除该文件已有的块后全部重写
+
 class ProcessLocalFileRequest(BaseModel):
     file_path: str
     file_type: FileType
     collection_name: str = "default"
+    file_id: Optional[str] = None  # 缺省为文件名（不含扩展名）
+    mode: IngestMode = IngestMode.INCREMENTAL
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    EXTRACTING = "extracting"
+    EMBEDDING = "embedding"
+    DONE = "done"
+    FAILED = "failed"
+
+class IngestJobResponse(BaseModel):
+    id: str
+    file_path: str
+    file_type: str
+    collection_name: str
+    file_id: Optional[str] = None
+    mode: IngestMode = IngestMode.INCREMENTAL
+    status: JobStatus
+    chunks: int = 0
+    error: Optional[str] = None
+
+class JobStatusRequest(BaseModel):
+    ids: List[str]
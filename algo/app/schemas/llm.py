@@ -9,6 +9,8 @@ class ChatCompletionRequest(BaseModel):
     messages: List[Message]
     model: Optional[str] = None
     stream: bool = False
+    # 为 False 时跳过响应缓存（例如用户主动要求重新生成）
+    cache: bool = True
 
 class ChatCompletionResponseChoice(BaseModel):
     index: int
@@ -33,6 +35,7 @@ class ContentGenerationRequest(BaseModel):
     # user_id: int
     prompt: str
     context: Optional[str] = None
+    cache: bool = True
 
 class ContentGenerationResponse(BaseModel):
     content: str
@@ -1,3 +1,4 @@
+from enum import Enum
 from pydantic import BaseModel
 from typing import List, Dict, Optional, Any
 
@@ -40,9 +41,16 @@ class DocumentUpdateRequest(BaseModel):
     embeddings: Optional[List[List[float]]] = None
 
 class DocumentDeleteRequest(BaseModel):
-    """删除文档请求"""
+    """删除文档请求：按 id、元数据条件（如 {"file_id": "12"}）或两者同时筛选"""
     collection_name: str
-    ids: List[str]
+    ids: Optional[List[str]] = None
+    where: Optional[Dict[str, Any]] = None
+
+class QueryMode(str, Enum):
+    """检索方式"""
+    DENSE = "dense"
+    LEXICAL = "lexical"
+    HYBRID = "hybrid"
 
 class QueryRequest(BaseModel):
     """查询请求"""
@@ -52,6 +60,16 @@ class QueryRequest(BaseModel):
     where: Optional[Dict[str, Any]] = None
     where_document: Optional[Dict[str, Any]] = None
     include: Optional[List[str]] = None
+    mode: QueryMode = QueryMode.DENSE
+    # 先用词法索引缩小候选集，再做向量检索
+    prefilter: bool = False
+    # 多取候选后用 MMR 选出多样的结果并去掉近似重复的块，未给出的参数使用配置中的默认值
+    diversify: bool = False
+    fetch_k: Optional[int] = None
+    mmr_lambda: Optional[float] = None
+    dedup_threshold: Optional[float] = None
+    # 调用方已有查询向量时直接传入（与 query_texts 一一对应），省去一次嵌入
+    query_embeddings: Optional[List[List[float]]] = None
 
 class QueryResultItem(BaseModel):
     """单个查询结果项"""
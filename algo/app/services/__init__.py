@@ -2,10 +2,12 @@ from .embedding import EmbeddingService
 from .vector_db import VectorDBService
 from .llm import LLMService
 from .document import DocumentService
+from .ingest import IngestService
 
 __all__ = [
     "EmbeddingService",
     "VectorDBService",
     "LLMService",
-    "DocumentService"
+    "DocumentService",
+    "IngestService"
 ]
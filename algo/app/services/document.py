@@ -1,55 +1,172 @@
-from typing import List, Dict
+import asyncio
+import hashlib
+import threading
+from itertools import islice
+from typing import Awaitable, Callable, Iterator, Dict, List, Optional, Set
 from pathlib import Path
-from utils.file_processor import FileProcessor
+from config import settings
+from utils.file_processor import FileProcessor, PageText
+from utils.chunker import Chunk, TextChunker
 from services.embedding import EmbeddingService
 from models.vector_db import vector_db
+from utils.bm25 import lexical_index
 
 class DocumentService:
     @staticmethod
-    def process_uploaded_file(file_path: str, file_type: str, collection_name: str) -> Dict:
-        """处理上传的文件并存入向量数据库"""
-        if file_type == "application/pdf":
-            text = FileProcessor.extract_text_from_pdf(file_path)
-        elif file_type == "application/zip":
-            text = FileProcessor.extract_text_from_latex_zip(file_path)
-        else:
+    async def _no_progress(status: str, chunks: Optional[int] = None):
+        pass
+
+    @staticmethod
+    async def process_uploaded_file(
+        file_path: str,
+        file_type: str,
+        collection_name: str,
+        file_id: Optional[str] = None,
+        mode: str = "incremental",
+        progress: Optional[Callable[..., Awaitable[None]]] = None
+    ) -> Dict:
+        """处理上传的文件并存入向量数据库，await progress(status, chunks) 用于汇报进度
+
+        块 ID 由 file_id 与块内容的哈希组成。incremental 模式只写入集合中尚不存在的块并删除
+        不再出现的旧块；full 模式先删除该文件已有的全部块再重新写入。
+        提取、分块、嵌入与写入按批流水线进行，内存占用与文档大小无关。
+        """
+        progress = progress or DocumentService._no_progress
+        file_id = file_id or Path(file_path).stem
+        if file_type not in ("application/pdf", "application/zip"):
             raise ValueError(f"Unsupported file type: {file_type}")
-        
-        # 分块处理文本
-        chunks = DocumentService._chunk_text(text)
-        
-        # 获取嵌入向量
-        # embeddings = EmbeddingService.embed_documents(chunks)
-        
+        await progress("extracting")
+
         # 存入向量数据库
         print(f"Processing file: {file_path}")
         print(f"Collection name: {collection_name}")
-        try:
-            collection = vector_db.get_collection(collection_name)
-        except Exception as e:
-            print(f"Collection {collection_name} not found, creating new one")
-            collection = vector_db.create_collection(collection_name)
+        collection = await asyncio.to_thread(vector_db.get_or_create_collection, collection_name)
 
         print(f"Queried collection: {collection_name}")
-        print(f"Adding {len(chunks)} chunks to collection")
-        ids = [f"{Path(file_path).stem}_{i}" for i in range(len(chunks))]
-        collection.add(
-            documents=chunks,
-            # embeddings=embeddings,
-            ids=ids
-        )
-        
+        await asyncio.to_thread(lexical_index.ensure, collection)
+
+        # 旧版本以 "{文件名}_{序号}" 为 ID 且没有 file_id 元数据，按 file_id 查不到，先整体删除再按新 ID 写入
+        legacy_ids = await asyncio.to_thread(DocumentService._legacy_chunk_ids, collection, Path(file_path).stem)
+        if legacy_ids:
+            print(f"Removing {len(legacy_ids)} legacy chunks of {file_path}")
+            await asyncio.to_thread(collection.delete, ids=legacy_ids)
+            await asyncio.to_thread(lexical_index.delete, collection, legacy_ids)
+            vector_db.bump_generation(collection_name)
+
+        existing = set((await asyncio.to_thread(
+            collection.get, where={"file_id": file_id}, include=[]
+        ))["ids"])
+        if mode == "full" and existing:
+            await asyncio.to_thread(collection.delete, ids=list(existing))
+            await asyncio.to_thread(lexical_index.delete, collection, list(existing))
+            vector_db.bump_generation(collection_name)
+            existing = set()
+
+        # 分块处理文本，边提取边切分，按批取出
+        chunks = TextChunker().chunk_pages(DocumentService._iter_pages(file_path, file_type))
+        seen: Set[str] = set()
+        added = 0
+        inflight: Set[asyncio.Task] = set()
+        # 取批在线程中进行，被取消时线程可能仍在读取；关闭生成器前等它读完
+        chunks_lock = threading.Lock()
+
+        def next_batch() -> List[Chunk]:
+            with chunks_lock:
+                return list(islice(chunks, settings.ingest_batch_size))
+
+        def close_chunks():
+            with chunks_lock:
+                chunks.close()
+
+        try:
+            while True:
+                batch = await asyncio.to_thread(next_batch)
+                if not batch:
+                    break
+                # 内容相同的块只保留一份，已存在的块跳过
+                new_chunks = {}
+                for chunk in batch:
+                    chunk_id = DocumentService._chunk_id(file_id, chunk.text)
+                    if chunk_id not in seen:
+                        seen.add(chunk_id)
+                        if chunk_id not in existing:
+                            new_chunks[chunk_id] = chunk
+                if not new_chunks:
+                    continue
+
+                if len(inflight) >= settings.ingest_max_inflight_batches:
+                    done, inflight = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                inflight.add(asyncio.create_task(
+                    DocumentService._write_batch(collection, file_id, new_chunks)
+                ))
+                added += len(new_chunks)
+                await progress("embedding", len(seen))
+
+            await asyncio.gather(*inflight)
+        except BaseException:
+            for task in inflight:
+                task.cancel()
+            raise
+        finally:
+            # 关闭时会停止 PDF 提取进程池，不在事件循环上进行
+            await asyncio.to_thread(close_chunks)
+            await asyncio.to_thread(lexical_index.save, collection_name)
+
+        stale_ids = list(existing - seen)
+        if stale_ids:
+            await asyncio.to_thread(collection.delete, ids=stale_ids)
+            await asyncio.to_thread(lexical_index.delete, collection, stale_ids)
+            await asyncio.to_thread(lexical_index.save, collection_name)
+            vector_db.bump_generation(collection_name)
+        print(f"Upserted {added} chunks, deleted {len(stale_ids)} stale chunks, "
+              f"{len(seen) - added} unchanged")
+
         return {
             "status": "success",
-            "chunks": len(chunks),
+            "chunks": len(seen),
+            "added": added,
+            "deleted": len(stale_ids),
             "collection": collection_name
         }
 
     @staticmethod
-    def _chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
-        """将文本分割成块"""
-        words = text.split()
-        chunks = []
-        for i in range(0, len(words), chunk_size):
-            chunks.append(' '.join(words[i:i+chunk_size]))
-        return chunks
+    async def _write_batch(collection, file_id: str, chunks: Dict[str, Chunk]):
+        """通过共享的嵌入客户端嵌入一批块，并显式带上 embeddings 写入集合，同时更新词法索引"""
+        ids = list(chunks)
+        documents = [chunk.text for chunk in chunks.values()]
+        embeddings = await EmbeddingService.embed_documents(documents)
+        await asyncio.to_thread(
+            collection.upsert,
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=[{"file_id": file_id, "page": chunk.page} for chunk in chunks.values()]
+        )
+        await asyncio.to_thread(lexical_index.add, collection, ids, documents)
+        vector_db.bump_generation(collection.name)
+
+    @staticmethod
+    def _iter_pages(file_path: str, file_type: str) -> Iterator[PageText]:
+        if file_type == "application/pdf":
+            yield from FileProcessor.iter_pdf_pages(file_path)
+        elif file_type == "application/zip":
+            yield PageText(1, 0, FileProcessor.extract_text_from_latex_zip(file_path))
+
+    @staticmethod
+    def _legacy_chunk_ids(collection, stem: str, page_size: int = 256) -> List[str]:
+        """查找旧版本写入的块：ID 为连续的 {stem}_0, {stem}_1, ...，按段探测直到某段不满"""
+        found: List[str] = []
+        start = 0
+        while True:
+            ids = [f"{stem}_{i}" for i in range(start, start + page_size)]
+            hits = collection.get(ids=ids, include=[])["ids"]
+            found.extend(hits)
+            if len(hits) < page_size:
+                return found
+            start += page_size
+
+    @staticmethod
+    def _chunk_id(file_id: str, text: str) -> str:
+        return f"{file_id}_{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
@@ -1,24 +1,30 @@
-import requests
-from typing import List
+from typing import Dict, List
 from config import settings
-from schemas.embedding import EmbeddingResponse
+from schemas.embedding import EmbeddingResponse, EmbeddingData
+from models.embedding import embedding_client
+from utils.embedding_cache import get_embedding_cache, embedding_cache_stats
 
 class EmbeddingService:
     @staticmethod
-    def get_embeddings(texts: List[str]) -> EmbeddingResponse:
+    async def get_embeddings(texts: List[str]) -> EmbeddingResponse:
         """获取文本的嵌入向量"""
-        response = requests.post(
-            settings.embedding_api_base,
-            json={
-                "input": texts,
-                "model": settings.embedding_model
-            }
+        embeddings = await EmbeddingService.embed_documents(texts)
+        return EmbeddingResponse(
+            data=[
+                EmbeddingData(embedding=embedding, index=i)
+                for i, embedding in enumerate(embeddings)
+            ],
+            model=settings.embedding_model
         )
-        response.raise_for_status()
-        return EmbeddingResponse(**response.json())
     
     @staticmethod
-    def embed_documents(documents: List[str]) -> List[List[float]]:
-        """批量嵌入文档"""
-        response = EmbeddingService.get_embeddings(documents)
-        return [data.embedding for data in response.data]
+    async def embed_documents(documents: List[str]) -> List[List[float]]:
+        """批量嵌入文档，优先读取嵌入缓存"""
+        cache = get_embedding_cache(settings.embedding_model)
+        if cache is None:
+            return await embedding_client.embed(documents)
+        return await cache.embed(documents, embedding_client.embed)
+
+    @staticmethod
+    def cache_stats() -> Dict:
+        return {"caches": embedding_cache_stats()}
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+from config import settings
+from models.job_queue import job_queue
+from services.document import DocumentService
+
+class IngestService:
+    """后台入库任务：上传接口只负责入队，由有界的 worker 池执行 DocumentService"""
+
+    _workers: List[asyncio.Task] = []
+    _wakeup: Optional[asyncio.Event] = None
+    _running: Set[str] = set()
+
+    @staticmethod
+    def enqueue(
+        file_path: str,
+        file_type: str,
+        collection_name: str,
+        file_id: Optional[str] = None,
+        mode: str = "incremental"
+    ) -> Dict:
+        job = job_queue.enqueue(file_path, file_type, collection_name, file_id, mode)
+        if IngestService._wakeup is not None:
+            IngestService._wakeup.set()
+        return job
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Dict]:
+        return job_queue.get(job_id)
+
+    @staticmethod
+    def get_jobs(job_ids: List[str]) -> List[Dict]:
+        return job_queue.get_many(job_ids)
+
+    @staticmethod
+    def start_workers():
+        IngestService._wakeup = asyncio.Event()
+        IngestService._workers = [
+            asyncio.create_task(IngestService._worker(i))
+            for i in range(settings.ingest_workers)
+        ] + [asyncio.create_task(IngestService._heartbeat())]
+
+    @staticmethod
+    async def stop_workers():
+        for task in IngestService._workers:
+            task.cancel()
+        await asyncio.gather(*IngestService._workers, return_exceptions=True)
+        IngestService._workers = []
+
+    @staticmethod
+    async def _heartbeat():
+        """定期为本进程的进行中任务刷新心跳，并回收其他进程中断的任务"""
+        while True:
+            try:
+                await asyncio.to_thread(job_queue.heartbeat, list(IngestService._running))
+                requeued, failed = await asyncio.to_thread(
+                    job_queue.requeue_stale, settings.ingest_stale_after, settings.ingest_max_attempts
+                )
+                if failed:
+                    print(f"Gave up on {failed} repeatedly interrupted ingestion jobs")
+                if requeued:
+                    print(f"Requeued {requeued} interrupted ingestion jobs")
+                    IngestService._wakeup.set()
+            except Exception as e:
+                print(f"Ingestion heartbeat failed: {str(e)}")
+            await asyncio.sleep(settings.ingest_heartbeat_interval)
+
+    @staticmethod
+    async def _worker(index: int):
+        while True:
+            IngestService._wakeup.clear()
+            job = await asyncio.to_thread(job_queue.claim)
+            if job is None:
+                try:
+                    # 入队时被唤醒，同时定期轮询以接收其他进程写入的任务
+                    await asyncio.wait_for(IngestService._wakeup.wait(), settings.ingest_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await IngestService._run(job)
+
+    @staticmethod
+    async def _run(job: Dict):
+        job_id = job["id"]
+        print(f"Ingestion job {job_id} started: {job['file_path']}")
+
+        async def progress(status: str, chunks: Optional[int] = None):
+            await asyncio.to_thread(job_queue.update, job_id, status, chunks)
+
+        IngestService._running.add(job_id)
+        try:
+            result = await DocumentService.process_uploaded_file(
+                file_path=job["file_path"],
+                file_type=job["file_type"],
+                collection_name=job["collection_name"],
+                file_id=job["file_id"],
+                mode=job["mode"],
+                progress=progress
+            )
+            await asyncio.to_thread(job_queue.update, job_id, "done", result["chunks"])
+            print(f"Ingestion job {job_id} done: {result['chunks']} chunks")
+        except Exception as e:
+            print(f"Ingestion job {job_id} failed: {str(e)}")
+            await asyncio.to_thread(job_queue.update, job_id, "failed", None, str(e))
+        finally:
+            IngestService._running.discard(job_id)
@@ -1,30 +1,105 @@
-from typing import List, Dict, Any
-import requests
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from config import settings
 from schemas.llm import Message
+from models.llm import llm_client
+from services.embedding import EmbeddingService
+from utils.llm_cache import llm_cache
 
 class LLMService:
     @staticmethod
-    def chat_completion(messages: List[Message], stream: bool = False) -> Any:
-        url = settings.llm_api_base
-        payload = {
+    def _payload(messages: List[Message], stream: bool) -> Dict[str, Any]:
+        return {
             "model": settings.llm_model,
             "messages": [msg.dict() for msg in messages],
             "stream": stream
         }
 
-        if stream:
-            raise NotImplementedError("Streaming not implemented yet.")
-        
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json()
-    
     @staticmethod
-    def generate_review_content(prompt: str, context: str) -> str:
-        messages = [
+    def chat_messages(messages: List[Message]) -> List[Message]:
+        """对话接口的消息列表：在用户消息前加上系统提示，流式与非流式共用"""
+        return [
+            Message(role="system", content="你是一个乐于助人的AI助手。请用简洁明了的语言回答用户的问题。"),
+        ] + messages
+
+    @staticmethod
+    async def chat_completion(messages: List[Message], use_cache: bool = True) -> Any:
+        payload = LLMService._payload(messages, stream=False)
+        key = None
+        if use_cache and settings.llm_cache_chat:
+            key = llm_cache.key("chat", payload["model"], payload["messages"])
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
+        response = await llm_client.complete(payload)
+        if key is not None:
+            llm_cache.set(key, response)
+        return response
+
+    @staticmethod
+    async def chat_completion_stream(messages: List[Message]) -> AsyncIterator[bytes]:
+        """透传上游的 SSE 流"""
+        async for chunk in llm_client.stream(LLMService._payload(messages, stream=True)):
+            yield chunk
+
+    @staticmethod
+    def _review_messages(prompt: str, context: str) -> List[Message]:
+        return [
             Message(role="system", content="你是一个专业的学术助手，擅长撰写文献综述。"),
             Message(role="user", content=f"根据以下上下文:\n{context}\n\n按照下面的要求，撰写一段综述。请你不要回答无关内容，也不要在回答中包含markdown格式。要求如下：{prompt}")
         ]
-        response = LLMService.chat_completion(messages)
-        return response["choices"][0]["message"]["content"]
+    
+    @staticmethod
+    async def _cached_review(
+        messages: List[Message],
+        prompt: str,
+        context: str
+    ) -> Tuple[Optional[str], str, Optional[List[float]]]:
+        """查综述缓存，返回 (命中的内容, 精确键, 用于语义缓存的嵌入)"""
+        key = llm_cache.key("generate", settings.llm_model, [msg.dict() for msg in messages])
+        content = llm_cache.get(key)
+        vector = None
+        if content is None and settings.llm_cache_semantic:
+            try:
+                vector = (await EmbeddingService.embed_documents([f"{prompt}\n{context}"]))[0]
+                content = llm_cache.semantic_get(vector)
+                if content is not None:
+                    # 语义命中后补一条精确条目，相同输入下次不必再算嵌入
+                    llm_cache.set(key, content)
+            except Exception as e:
+                print(f"Semantic cache lookup failed: {str(e)}")
+        return content, key, vector
+
+    @staticmethod
+    async def generate_review_content(prompt: str, context: str, use_cache: bool = True) -> str:
+        messages = LLMService._review_messages(prompt, context)
+        use_cache = use_cache and settings.llm_cache_generate
+        if use_cache:
+            content, key, vector = await LLMService._cached_review(messages, prompt, context)
+            if content is not None:
+                return content
+        response = await LLMService.chat_completion(messages, use_cache=False)
+        content = response["choices"][0]["message"]["content"]
+        if use_cache:
+            llm_cache.set(key, content, vector)
+        return content
+
+    @staticmethod
+    async def generate_review_content_stream(prompt: str, context: str, use_cache: bool = True) -> AsyncIterator[str]:
+        """流式生成综述，逐个产出增量文本；命中缓存时一次产出全部内容，完整生成后写入缓存"""
+        messages = LLMService._review_messages(prompt, context)
+        use_cache = use_cache and settings.llm_cache_generate
+        if use_cache:
+            content, key, vector = await LLMService._cached_review(messages, prompt, context)
+            if content is not None:
+                yield content
+                return
+        deltas = []
+        async for delta in llm_client.stream_deltas(LLMService._payload(messages, stream=True)):
+            deltas.append(delta)
+            yield delta
+        if use_cache:
+            llm_cache.set(key, "".join(deltas), vector)
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        return llm_cache.stats()
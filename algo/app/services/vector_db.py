@@ -1,11 +1,49 @@
-from typing import List, Dict, Any
+import hashlib
+import json
+from typing import List, Dict, Any, Optional
+import numpy as np
+from config import settings
 from models.vector_db import vector_db
 from fastapi import HTTPException
+from utils.bm25 import lexical_index
+from utils.cache import LRUCache
+from utils.mmr import mmr_select
+
+# 查询结果缓存，键中带有集合的写入代数，写入后旧结果自然失效；
+# 代数只在本进程内递增，多进程部署时由 TTL 兜底
+query_cache = LRUCache(settings.query_cache_size, settings.query_cache_ttl)
 
 class VectorDBService:
     @staticmethod
-    def create_collection(collection_name: str) -> Dict[str, Any]:
-        collection = vector_db.create_collection(collection_name)
+    def create_collection(
+        collection_name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        get_or_create: bool = False
+    ) -> Dict[str, Any]:
+        if get_or_create:
+            collection = vector_db.get_or_create_collection(collection_name, metadata)
+        else:
+            collection = vector_db.create_collection(collection_name, metadata)
+        return {"status": "success", "collection": collection.name}
+
+    @staticmethod
+    def delete_collection(collection_name: str) -> Dict[str, Any]:
+        try:
+            vector_db.delete_collection(collection_name)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"No collection {collection_name} found")
+        return {"status": "success", "deleted_collection": collection_name}
+
+    @staticmethod
+    def update_collection(
+        collection_name: str,
+        new_name: Optional[str] = None,
+        new_metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        try:
+            collection = vector_db.update_collection(collection_name, new_name, new_metadata)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"No collection {collection_name} found")
         return {"status": "success", "collection": collection.name}
     
     @staticmethod
@@ -13,23 +51,84 @@ class VectorDBService:
         collection_name: str,
         documents: List[str],
         ids: List[str],
-        metadatas: List[Dict[str, Any]] = None
+        metadatas: List[Dict[str, Any]] = None,
+        embeddings: List[List[float]] = None
     ) -> Dict[str, Any]:
         collection = vector_db.get_collection(collection_name)
         collection.add(
             documents=documents,
             ids=ids,
-            metadatas=metadatas
+            metadatas=metadatas,
+            embeddings=embeddings
         )
+        lexical_index.add(collection, ids, documents, replace=False)
+        lexical_index.save(collection_name)
+        vector_db.bump_generation(collection_name)
         return {"status": "success", "count": len(ids)}
+
+    @staticmethod
+    def delete_documents(
+        collection_name: str,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """删除匹配的文档，同时更新词法索引并使该集合的查询缓存失效"""
+        if not ids and not where:
+            raise HTTPException(status_code=400, detail="Either ids or where must be provided")
+        try:
+            collection = vector_db.get_collection(collection_name)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=f"No collection {collection_name} found")
+        matched = collection.get(ids=ids, where=where, include=[])["ids"]
+        if matched:
+            collection.delete(ids=matched)
+            lexical_index.delete(collection, matched)
+            lexical_index.save(collection_name)
+            vector_db.bump_generation(collection_name)
+        return {"status": "success", "count": len(matched)}
     
     @staticmethod
     def query(
         collection_name: str,
         query_texts: List[str],
         n_results: int = 5,
-        where: Dict[str, Any] = None
+        where: Dict[str, Any] = None,
+        where_document: Dict[str, Any] = None,
+        mode: str = "dense",
+        prefilter: bool = False,
+        diversify: bool = False,
+        fetch_k: Optional[int] = None,
+        mmr_lambda: Optional[float] = None,
+        dedup_threshold: Optional[float] = None,
+        query_embeddings: Optional[List[List[float]]] = None
     ) -> Dict[str, Any]:
+        """mode 为 dense（向量）、lexical（BM25）或 hybrid（两路结果按倒数排名融合）；
+        prefilter 为 True 时先用词法索引取候选集，再只在候选集内做向量检索；
+        diversify 为 True 时先多取 fetch_k 个候选，去掉近似重复的块后按 MMR 选出 n_results 个；
+        给出 query_embeddings 时直接用它做向量检索，不再嵌入 query_texts；
+        纯 lexical 模式（且不做 MMR）不嵌入查询，结果的 distances 为 None，按 scores 排序
+        """
+        if diversify:
+            fetch_k = max(fetch_k or n_results * settings.mmr_fetch_factor, n_results)
+            mmr_lambda = settings.mmr_lambda if mmr_lambda is None else mmr_lambda
+            dedup_threshold = settings.mmr_dedup_threshold if dedup_threshold is None else dedup_threshold
+        cache_key = (
+            collection_name,
+            vector_db.generation(collection_name),
+            tuple(query_texts),
+            n_results,
+            json.dumps(where, sort_keys=True, ensure_ascii=False),
+            json.dumps(where_document, sort_keys=True, ensure_ascii=False),
+            mode,
+            prefilter,
+            (fetch_k, mmr_lambda, dedup_threshold) if diversify else None,
+            hashlib.sha1(np.asarray(query_embeddings, dtype=np.float32).tobytes()).hexdigest()
+            if query_embeddings is not None else None
+        )
+        cached = query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         print(f"Querying text: {query_texts}")
         print(f"Querying collection: {collection_name}")
         try:
@@ -41,15 +140,145 @@ class VectorDBService:
 
         print(f"Queried collection: {collection_name}")
 
-        results = collection.query(
-            query_texts=query_texts,
-            n_results=n_results,
-            where=where
-        )
-        print(results)
-        return {
-            "documents": results["documents"],
-            "distances": results["distances"],
-            "metadatas": results["metadatas"],
-            "ids": results["ids"]
-        }
+        if mode == "dense" and not prefilter and not diversify:
+            results = collection.query(
+                query_texts=query_texts if query_embeddings is None else None,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                where_document=where_document
+            )
+            response = {
+                "documents": results["documents"],
+                "distances": results["distances"],
+                "metadatas": results["metadatas"],
+                "ids": results["ids"]
+            }
+        else:
+            index = lexical_index.ensure(collection) if mode != "dense" or prefilter else None
+            if query_embeddings is None:
+                if mode == "lexical" and not diversify:
+                    query_embeddings = [None] * len(query_texts)
+                else:
+                    query_embeddings = vector_db.embedding_func(query_texts)
+            response = {"documents": [], "distances": [], "metadatas": [], "ids": [], "scores": []}
+            for text, embedding in zip(query_texts, query_embeddings):
+                hits = VectorDBService._query_one(
+                    collection, index, text, embedding, fetch_k if diversify else n_results,
+                    where, where_document, mode, prefilter, with_embeddings=diversify
+                )
+                if diversify:
+                    selected = mmr_select(
+                        embedding,
+                        np.array([hit["embeddings"] for hit in hits]),
+                        n_results,
+                        mmr_lambda,
+                        dedup_threshold
+                    )
+                    hits = [hits[i] for i in selected]
+                for key in response:
+                    response[key].append([hit[key] for hit in hits])
+        query_cache.set(cache_key, response)
+        return response
+
+    @staticmethod
+    def _query_one(
+        collection,
+        index,
+        text: str,
+        embedding,
+        n_results: int,
+        where: Optional[Dict[str, Any]],
+        where_document: Optional[Dict[str, Any]],
+        mode: str,
+        prefilter: bool,
+        with_embeddings: bool = False
+    ) -> List[Dict[str, Any]]:
+        """单条查询的逐条检索，返回按最终得分排序的命中列表；with_embeddings 时命中带上向量"""
+        fetch_k = n_results * settings.hybrid_fetch_factor
+        lexical = []
+        if index is not None:
+            lexical = index.search(text, settings.lexical_prefilter_size if prefilter else fetch_k)
+        hits: Dict[str, Dict[str, Any]] = {}
+        scores: Dict[str, float] = {}
+
+        if mode != "lexical":
+            # 预过滤：只在词法命中的候选集内做向量检索；没有词法命中时退回全量检索
+            candidate_ids = [id_ for id_, _ in lexical] if prefilter and lexical else None
+            dense = collection.query(
+                query_embeddings=[embedding],
+                n_results=n_results if mode == "dense" else fetch_k,
+                where=where,
+                where_document=where_document,
+                ids=candidate_ids,
+                include=["documents", "metadatas", "distances"] + (["embeddings"] if with_embeddings else [])
+            )
+            dense_embeddings = dense["embeddings"][0] if with_embeddings else [None] * len(dense["ids"][0])
+            for rank, (id_, document, metadata, distance, vector) in enumerate(zip(
+                dense["ids"][0], dense["documents"][0], dense["metadatas"][0], dense["distances"][0], dense_embeddings
+            )):
+                hits[id_] = {
+                    "ids": id_, "documents": document, "metadatas": metadata, "distances": distance, "embeddings": vector
+                }
+                scores[id_] = -distance if mode == "dense" else 1 / (settings.hybrid_rrf_k + rank + 1)
+
+        if mode != "dense":
+            for rank, (id_, score) in enumerate(lexical[:fetch_k]):
+                if mode == "lexical":
+                    scores[id_] = score
+                else:
+                    scores[id_] = scores.get(id_, 0.0) + 1 / (settings.hybrid_rrf_k + rank + 1)
+            # 只出现在词法结果中的文档：补取内容并按 where 条件过滤，同时计算向量距离
+            missing = [id_ for id_ in scores if id_ not in hits]
+            if missing:
+                extra = collection.get(
+                    ids=missing,
+                    where=where,
+                    where_document=where_document,
+                    include=["documents", "metadatas"] + (["embeddings"] if embedding is not None else [])
+                )
+                if embedding is not None:
+                    vectors = extra["embeddings"]
+                    distances = VectorDBService._distances(embedding, vectors, vector_db.distance_space(collection))
+                else:
+                    vectors = distances = [None] * len(extra["ids"])
+                for id_, document, metadata, distance, vector in zip(
+                    extra["ids"], extra["documents"], extra["metadatas"], distances, vectors
+                ):
+                    hits[id_] = {
+                        "ids": id_, "documents": document, "metadatas": metadata, "distances": distance, "embeddings": vector
+                    }
+
+        ranked = sorted(hits, key=lambda id_: scores[id_], reverse=True)[:n_results]
+        return [dict(hits[id_], scores=scores[id_]) for id_ in ranked]
+
+    @staticmethod
+    def _distances(query, embeddings, space: str) -> List[float]:
+        """与向量库一致的距离：cosine 为 1 - cos，ip 为 1 - 内积，l2 为平方欧氏距离"""
+        if embeddings is None or len(embeddings) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if space == "cosine":
+            norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(query)
+            return (1 - embeddings @ query / np.maximum(norms, 1e-12)).tolist()
+        if space == "ip":
+            return (1 - embeddings @ query).tolist()
+        return ((embeddings - query) ** 2).sum(axis=1).tolist()
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        return query_cache.stats()
+
+    @staticmethod
+    def warmup(collection_names: List[str]) -> Dict[str, int]:
+        """预先打开集合句柄并加载词法索引，避免首个查询承担冷启动开销；不存在的集合跳过"""
+        counts = {}
+        for name in collection_names:
+            try:
+                collection = vector_db.get_collection(name)
+                lexical_index.ensure(collection)
+                counts[name] = collection.count()
+            except Exception as e:
+                print(f"Warmup skipped collection {name}: {str(e)}")
+        return counts
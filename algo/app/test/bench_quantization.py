@@ -0,0 +1,66 @@
+"""量化检索基准：在合成的聚类数据上比较召回率与每向量内存占用
+
+用法: python bench_quantization.py --n 50000 --dim 1024 --queries 200 --k 10
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from models.numpy_store import NumpyCollection  # noqa: E402
+
+def make_data(n: int, dim: int, n_queries: int, n_clusters: int = 64, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n + n_queries)
+    data = centers[labels] + 0.5 * rng.normal(size=(n + n_queries, dim)).astype(np.float32)
+    return data[:n], data[n:]
+
+def recall(found, truth) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / sum(len(t) for t in truth)
+
+def run(args):
+    vectors, queries = make_data(args.n, args.dim, args.queries)
+    configs = [("none", 0, 0), ("int8", 0, 0), ("int8", 0, args.rerank)]
+    for m in args.subspaces:
+        configs += [("pq", m, 0), ("pq", m, args.rerank)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        truth = None
+        for mode, m, rerank in configs:
+            path = Path(tmp) / f"{mode}_{m}_{rerank}"
+            path.mkdir()
+            collection = NumpyCollection(path, path.name, quantization=mode, pq_subspaces=m or 64, rerank_factor=rerank)
+            for start in range(0, args.n, 10000):
+                batch = vectors[start:start + 10000]
+                collection.add(ids=[str(i) for i in range(start, start + len(batch))], embeddings=batch)
+
+            start = time.perf_counter()
+            collection.wait_for_codes()  # 写入后由后台线程训练与编码
+            build = time.perf_counter() - start
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=queries, n_results=args.k, include=[])
+            elapsed = time.perf_counter() - start
+
+            if truth is None:
+                truth = result["ids"]
+            quantizer = collection._quantizer
+            size = quantizer.bytes_per_vector(args.dim) if quantizer else args.dim * 4
+            label = mode if mode != "pq" else f"pq{m}"
+            label += f"+rerank{rerank}" if rerank else ""
+            print(f"{label:<18} recall@{args.k}={recall(result['ids'], truth):.3f} "
+                  f"bytes/vec={size:<5} build={build:.2f}s query={elapsed * 1000 / args.queries:.2f}ms/q")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--subspaces", type=int, nargs="+", default=[32, 64, 128])
+    run(parser.parse_args())
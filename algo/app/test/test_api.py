@@ -55,7 +55,22 @@ def test_llm():
     print("LLM Chat Test:")
     print(response.json())
 
+def test_llm_stream():
+    with requests.post(
+        f"{BASE_URL}/llm/generate/stream",
+        json={
+            "prompt": "介绍一下检索增强生成。",
+            "context": ""
+        },
+        stream=True
+    ) as response:
+        print("LLM Stream Test:")
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                print(line)
+
 if __name__ == "__main__":
     test_embedding()
     test_vector_db()
     test_llm()
+    test_llm_stream()
@@ -1,5 +1,6 @@
-from .file_processor import FileProcessor
+from .file_processor import FileProcessor, PageText
+from .chunker import TextChunker, Chunk
 # from .logger import setup_logger
 
 # __all__ = ["FileProcessor", "setup_logger"]
-__all__ = ["FileProcessor"]
+__all__ = ["FileProcessor", "PageText", "TextChunker", "Chunk"]
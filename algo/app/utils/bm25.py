@@ -0,0 +1,270 @@
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from config import settings
+from utils.chunker import CJK_CHARS
+
+_WORD_RE = re.compile(f"[{CJK_CHARS}]+|[a-z0-9_]+")
+_CJK_RE = re.compile(f"[{CJK_CHARS}]")
+
+def tokenize(text: str) -> List[str]:
+    """词法检索用的分词：拉丁字母与数字按单词小写化，CJK 连续片段切成相邻二元组"""
+    tokens = []
+    for match in _WORD_RE.finditer(unicodedata.normalize("NFKC", text).lower()):
+        word = match.group()
+        if not _CJK_RE.match(word):
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+class BM25Index:
+    """单个集合的倒排索引
+
+    每个词的倒排表是一对紧凑数组（行号 int32、词频 uint16）；删除只打墓碑（文档长度置 0），
+    墓碑过多或落盘时再压缩。落盘格式为 CSR 风格的 npz：词表 + 偏移 + 拼接的倒排表。
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.total_length = 0
+        self.dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, ids: List[str], documents: List[str], replace: bool = True):
+        """写入文档；replace 为 False 时与 Chroma 的 add 一致，跳过已存在的 id"""
+        with self._lock:
+            existing = [id_ for id_ in ids if id_ in self.rows]
+            if replace:
+                self.delete(existing)
+            else:
+                skip = set(existing)
+                pairs = [(id_, doc) for id_, doc in zip(ids, documents) if id_ not in skip]
+                ids, documents = [id_ for id_, _ in pairs], [doc for _, doc in pairs]
+            if not ids:
+                return
+
+            new_postings: Dict[str, Tuple[List[int], List[int]]] = {}
+            lengths = []
+            for id_, document in zip(ids, documents):
+                row = len(self.ids)
+                self.ids.append(id_)
+                self.rows[id_] = row
+                counts = Counter(tokenize(document or ""))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    rows, tfs = new_postings.setdefault(term, ([], []))
+                    rows.append(row)
+                    tfs.append(min(tf, 65535))
+            # 长度为 0 表示已删除，空文档记为 1 以区分
+            lengths = np.maximum(np.array(lengths, dtype=np.int32), 1)
+            self.lengths = np.concatenate([self.lengths, lengths])
+            self.total_length += int(lengths.sum())
+            for term, (rows, tfs) in new_postings.items():
+                rows, tfs = np.array(rows, dtype=np.int32), np.array(tfs, dtype=np.uint16)
+                if term in self.postings:
+                    old_rows, old_tfs = self.postings[term]
+                    rows, tfs = np.concatenate([old_rows, rows]), np.concatenate([old_tfs, tfs])
+                self.postings[term] = (rows, tfs)
+            self.dirty = True
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            for id_ in ids:
+                row = self.rows.pop(id_, None)
+                if row is None:
+                    continue
+                self.ids[row] = None
+                self.total_length -= int(self.lengths[row])
+                self.lengths[row] = 0
+                self.dirty = True
+            if len(self.ids) > 1000 and len(self.ids) > 2 * len(self.rows):
+                self.compact()
+
+    def compact(self):
+        """去掉墓碑行并重排行号"""
+        with self._lock:
+            if len(self.ids) == len(self.rows):
+                return
+            alive = self.lengths > 0
+            remap = np.cumsum(alive, dtype=np.int32) - 1
+            postings = {}
+            for term, (rows, tfs) in self.postings.items():
+                keep = alive[rows]
+                if keep.any():
+                    postings[term] = (remap[rows[keep]], tfs[keep])
+            self.postings = postings
+            self.ids = [id_ for id_ in self.ids if id_ is not None]
+            self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+            self.lengths = self.lengths[alive]
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """返回按 BM25 分数降序的 (id, 分数)，不含零分文档"""
+        with self._lock:
+            n_docs = len(self.rows)
+            if not n_docs or top_k <= 0:
+                return []
+            avg_length = self.total_length / n_docs
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            for term in set(tokenize(query)):
+                if term not in self.postings:
+                    continue
+                rows, tfs = self.postings[term]
+                lengths = self.lengths[rows]
+                alive = lengths > 0
+                rows, tfs, lengths = rows[alive], tfs[alive].astype(np.float32), lengths[alive]
+                if not len(rows):
+                    continue
+                idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+                scores[rows] += idf * tfs * (self.k1 + 1) / (
+                    tfs + self.k1 * (1 - self.b + self.b * lengths / avg_length)
+                )
+            hits = np.flatnonzero(scores)
+            if len(hits) > top_k:
+                hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+            hits = hits[np.argsort(-scores[hits])]
+            return [(self.ids[row], float(scores[row])) for row in hits]
+
+    def save(self, path: Path):
+        with self._lock:
+            self.compact()
+            terms = sorted(self.postings)
+            sizes = [len(self.postings[term][0]) for term in terms]
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=offsets[1:])
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    terms=np.array(terms, dtype=str),
+                    offsets=offsets,
+                    rows=np.concatenate([self.postings[t][0] for t in terms]) if terms else np.zeros(0, np.int32),
+                    tfs=np.concatenate([self.postings[t][1] for t in terms]) if terms else np.zeros(0, np.uint16),
+                    ids=np.array(self.ids, dtype=str),
+                    lengths=self.lengths
+                )
+            os.replace(tmp_path, path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        index = cls()
+        with np.load(path) as data:
+            offsets, rows, tfs = data["offsets"], data["rows"], data["tfs"]
+            # 各词的倒排表是拼接数组上的视图，不额外复制
+            index.postings = {
+                term: (rows[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]])
+                for i, term in enumerate(data["terms"].tolist())
+            }
+            index.ids = data["ids"].tolist()
+            index.lengths = data["lengths"]
+        index.rows = {id_: row for row, id_ in enumerate(index.ids)}
+        index.total_length = int(index.lengths.sum())
+        return index
+
+class LexicalIndexStore:
+    """按集合名管理 BM25 索引，文件为 {path}/{集合名}.npz；
+    多个进程共用同一目录时，按文件修改时间发现其他进程保存的新索引并重新加载
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._indexes: Dict[str, BM25Index] = {}
+        # 内存中的索引对应的文件修改时间
+        self._mtimes: Dict[str, Optional[int]] = {}
+        # 每个集合一把锁，重建或重新加载一个集合的索引时不阻塞其他集合的查询；_lock 只保护锁表
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _collection_lock(self, name: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def _file(self, name: str) -> Path:
+        return self.path / f"{name}.npz"
+
+    def _mtime(self, name: str) -> Optional[int]:
+        try:
+            return self._file(name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _save(self, name: str, index: BM25Index):
+        index.save(self._file(name))
+        self._mtimes[name] = self._mtime(name)
+
+    def ensure(self, collection) -> BM25Index:
+        """获取集合的索引；文件被其他进程更新过时重新加载，索引不存在或与集合文档数不一致时从集合全量重建"""
+        name = collection.name
+        with self._collection_lock(name):
+            index = self._indexes.get(name)
+            mtime = self._mtime(name)
+            # 有未保存修改的索引以内存为准
+            if index is not None and (index.dirty or mtime == self._mtimes.get(name)):
+                return index
+            index = BM25Index.load(self._file(name)) if mtime is not None else None
+            self._mtimes[name] = mtime
+            if index is None or len(index) != collection.count():
+                print(f"Building lexical index for collection: {name}")
+                index = BM25Index()
+                offset = 0
+                while True:
+                    page = collection.get(limit=5000, offset=offset, include=["documents"])
+                    if not page["ids"]:
+                        break
+                    index.add(page["ids"], page["documents"])
+                    offset += len(page["ids"])
+                self._save(name, index)
+            self._indexes[name] = index
+            return index
+
+    def add(self, collection, ids: List[str], documents: List[str], replace: bool = True):
+        self.ensure(collection).add(ids, documents, replace=replace)
+
+    def delete(self, collection, ids: List[str]):
+        self.ensure(collection).delete(ids)
+
+    def save(self, name: str):
+        index = self._indexes.get(name)
+        if index is not None and index.dirty:
+            self._save(name, index)
+
+    def drop(self, name: str):
+        with self._collection_lock(name):
+            self._indexes.pop(name, None)
+            self._mtimes.pop(name, None)
+            if self._file(name).exists():
+                os.remove(self._file(name))
+
+    def rename(self, name: str, new_name: str):
+        if name == new_name:
+            return
+        # 按名字顺序加锁，避免与反向的改名互相等待
+        first, second = sorted([name, new_name])
+        with self._collection_lock(first), self._collection_lock(second):
+            index = self._indexes.pop(name, None)
+            self._mtimes.pop(name, None)
+            if self._file(name).exists():
+                os.replace(self._file(name), self._file(new_name))
+            if index is not None:
+                self._indexes[new_name] = index
+                self._mtimes[new_name] = self._mtime(new_name)
+
+lexical_index = LexicalIndexStore(settings.lexical_index_path)
@@ -0,0 +1,127 @@
+import re
+from functools import lru_cache
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from config import settings
+from utils.file_processor import PageText
+
+# 以下正则与 approx_token_count 在 backend/app/service/context_packer.py 中有一份副本
+# （两个应用分别部署，不共享代码），修改时需同步，否则分块与上下文装箱的 token 预算会不一致
+# CJK 统一表意文字、扩展 A、兼容表意文字，以及日文假名和韩文音节
+CJK_CHARS = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_TOKEN_RE = re.compile(f"[{CJK_CHARS}]|[A-Za-z0-9_]+|[^\\s{CJK_CHARS}A-Za-z0-9_]")
+# 句末标点后、英文句点后的空白处、以及空行处切分
+_SENTENCE_RE = re.compile(r"(?<=[。！？；!?;])|(?<=[.])\s+|\n\s*\n")
+
+class Chunk(NamedTuple):
+    index: int
+    text: str
+    page: Optional[int]  # 块起始处所在页码
+
+def approx_token_count(text: str) -> int:
+    """近似的模型 token 数：CJK 字符每字一个，拉丁单词约每 4 个字符一个，其余符号各一个"""
+    count = 0
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        count += (len(token) + 3) // 4 if token[0].isascii() and token[0].isalnum() else 1
+    return count
+
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer: str = "") -> Callable[[str], int]:
+    """配置了分词器且安装了 tokenizers 时按真实 token 计数，否则使用近似计数"""
+    if tokenizer:
+        try:
+            from tokenizers import Tokenizer
+            model = Tokenizer.from_pretrained(tokenizer)
+            return lambda text: len(model.encode(text, add_special_tokens=False).ids)
+        except Exception as e:
+            print(f"Failed to load tokenizer {tokenizer}, falling back to approximate counting: {str(e)}")
+    return approx_token_count
+
+class TextChunker:
+    """按 token 预算切分文本，优先在句子/段落边界断开，块之间保留重叠"""
+
+    def __init__(
+        self,
+        chunk_size: Optional[int] = None,
+        overlap: Optional[int] = None,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        self.chunk_size = chunk_size or settings.chunk_size_tokens
+        self.overlap = settings.chunk_overlap_tokens if overlap is None else overlap
+        self.count_tokens = count_tokens or get_token_counter(settings.chunk_tokenizer)
+
+    def _sentences(self, pages: Iterable[PageText]) -> Iterator[Tuple[str, int, int]]:
+        """产出 (句子, token 数, 页码)，超长的句子会被硬切分"""
+        for page in pages:
+            for sentence in _SENTENCE_RE.split(page.text):
+                sentence = sentence.strip() if sentence else ""
+                if not sentence:
+                    continue
+                tokens = self.count_tokens(sentence)
+                if tokens <= self.chunk_size:
+                    yield sentence, tokens, page.page
+                    continue
+                for piece in self._hard_split(sentence):
+                    yield piece, self.count_tokens(piece), page.page
+
+    def _hard_split(self, text: str) -> Iterator[str]:
+        """没有可用边界时按 token 边界切开，超长的单个词按字符切开"""
+        pieces = []
+        for match in _TOKEN_RE.finditer(text):
+            token = match.group()
+            if self.count_tokens(token) <= self.chunk_size:
+                pieces.append((match.start(), match.end()))
+                continue
+            step = max(1, len(token) * self.chunk_size // self.count_tokens(token))
+            for start in range(match.start(), match.end(), step):
+                pieces.append((start, min(start + step, match.end())))
+
+        start = None
+        tokens = 0
+        for piece_start, piece_end in pieces:
+            piece_tokens = self.count_tokens(text[piece_start:piece_end])
+            if start is not None and tokens + piece_tokens > self.chunk_size:
+                yield text[start:piece_start].strip()
+                start = None
+            if start is None:
+                start, tokens = piece_start, 0
+            tokens += piece_tokens
+        if start is not None and text[start:].strip():
+            yield text[start:].strip()
+
+    @staticmethod
+    def _join(sentences: List[str]) -> str:
+        # 只在两侧都是 ASCII 字符时插入空格，CJK 文本直接相连
+        text = sentences[0]
+        for sentence in sentences[1:]:
+            if text[-1:].isascii() and sentence[:1].isascii():
+                text += " " + sentence
+            else:
+                text += sentence
+        return text
+
+    def chunk_pages(self, pages: Iterable[PageText]) -> Iterator[Chunk]:
+        """流式切分：逐页消费提取结果，逐块产出"""
+        buffer: List[Tuple[str, int, int]] = []
+        buffer_tokens = 0
+        index = 0
+        for sentence, tokens, page in self._sentences(pages):
+            if buffer and buffer_tokens + tokens > self.chunk_size:
+                yield Chunk(index, self._join([s for s, _, _ in buffer]), buffer[0][2])
+                index += 1
+                # 保留末尾若干句作为下一块的重叠部分
+                kept: List[Tuple[str, int, int]] = []
+                kept_tokens = 0
+                for item in reversed(buffer):
+                    if kept_tokens + item[1] > self.overlap or kept_tokens + item[1] + tokens > self.chunk_size:
+                        break
+                    kept.insert(0, item)
+                    kept_tokens += item[1]
+                buffer, buffer_tokens = kept, kept_tokens
+            buffer.append((sentence, tokens, page))
+            buffer_tokens += tokens
+        if buffer:
+            yield Chunk(index, self._join([s for s, _, _ in buffer]), buffer[0][2])
+
+    def chunk_text(self, text: str) -> List[str]:
+        return [chunk.text for chunk in self.chunk_pages([PageText(1, 0, text)])]
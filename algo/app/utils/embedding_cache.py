@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+from config import settings
+from utils.cache import LRUCache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def _normalize(text: str) -> str:
+    """归一化文本，使空白和全半角差异不影响缓存命中"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+class EmbeddingCache:
+    """按 (模型名, 归一化文本哈希) 寻址的两级嵌入缓存
+
+    内存层为有界 LRU；磁盘层为定长向量的追加文件（vectors.bin）
+    加上逐行记录键的 keys.txt，第 i 行的键对应第 i 个向量，读取时使用 memmap。
+    多个进程可共享同一目录：写入时持有文件锁，行号以文件实际大小为准；
+    中断的写入留下的不完整尾部在下次加锁同步时截断到两个文件一致的长度。
+    异步接口只在事件循环上访问内存层，磁盘层的读写与文件锁放到线程中。
+    """
+
+    def __init__(self, model: str, path: Optional[str] = None, memory_size: int = 50000, dtype: str = "float16"):
+        self.model = model
+        self.dtype = np.dtype(dtype)
+        self.memory = LRUCache(memory_size)
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}
+        self._n_rows = 0  # 已读入 _rows 的行数
+        self._keys_offset = 0  # keys.txt 中已读到的字节位置
+        self._dim: Optional[int] = None
+        self._mmap: Optional[np.memmap] = None
+        self._dir = None
+        if path:
+            self._dir = Path(path) / re.sub(r"[^\w.-]", "_", model)
+            self._dir.mkdir(parents=True, exist_ok=True)
+            with self._lock, self._file_lock():
+                self._sync()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{_normalize(text)}".encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程的互斥锁；没有 fcntl 的平台上退化为只在进程内互斥"""
+        with open(self._dir / "lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load_meta(self) -> bool:
+        meta_path = self._dir / "meta.json"
+        if self._dim is None and meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self._dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])
+        return self._dim is not None
+
+    def _vector_rows(self) -> int:
+        vector_path = self._dir / "vectors.bin"
+        if self._dim is None or not vector_path.exists():
+            return 0
+        return vector_path.stat().st_size // (self._dim * self.dtype.itemsize)
+
+    def _sync(self):
+        """读入其他进程追加的行，并把两个文件截断到一致的长度；调用方需持有文件锁"""
+        if not self._load_meta():
+            return
+        keys_path = self._dir / "keys.txt"
+        vector_path = self._dir / "vectors.bin"
+        n_vectors = self._vector_rows()
+        new_keys: List[str] = []
+        offset = self._keys_offset
+        if keys_path.exists():
+            with open(keys_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    # 不完整的最后一行以及没有对应向量的键都不算数
+                    if not line.endswith(b"\n") or self._n_rows + len(new_keys) >= n_vectors:
+                        break
+                    new_keys.append(line[:-1].decode("utf-8"))
+                    offset += len(line)
+        n_rows = self._n_rows + len(new_keys)
+        if keys_path.exists() and keys_path.stat().st_size > offset:
+            with open(keys_path, "r+b") as f:
+                f.truncate(offset)
+        row_bytes = self._dim * self.dtype.itemsize
+        if vector_path.exists() and vector_path.stat().st_size > n_rows * row_bytes:
+            print(f"Truncating embedding cache {self._dir} to {n_rows} consistent rows")
+            with open(vector_path, "r+b") as f:
+                f.truncate(n_rows * row_bytes)
+        for i, key in enumerate(new_keys):
+            # 多个进程可能写入同一个键，保留最早的一行
+            self._rows.setdefault(key, self._n_rows + i)
+        self._n_rows = n_rows
+        self._keys_offset = offset
+
+    def _refresh(self):
+        """其他进程追加了向量时重新同步"""
+        if self._dim is None and not (self._dir / "meta.json").exists():
+            return
+        if self._dim is None or self._vector_rows() > self._n_rows:
+            with self._file_lock():
+                self._sync()
+
+    def _disk_get(self, key: str) -> Optional[np.ndarray]:
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        if self._mmap is None or row >= self._mmap.shape[0]:
+            self._mmap = np.memmap(
+                self._dir / "vectors.bin",
+                dtype=self.dtype,
+                mode="r",
+                shape=(self._n_rows, self._dim)
+            )
+        return np.asarray(self._mmap[row], dtype=np.float32)
+
+    def _disk_put(self, keys: List[str], vectors: np.ndarray):
+        """先写向量再写键；行号取自同步后的文件实际行数。调用方需持有文件锁"""
+        if not self._load_meta():
+            self._dim = vectors.shape[1]
+            with open(self._dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({"model": self.model, "dim": self._dim, "dtype": self.dtype.name}, f)
+        if vectors.shape[1] != self._dim:
+            return
+        self._sync()
+        new = [i for i, key in enumerate(keys) if key not in self._rows]
+        if not new:
+            return
+        keys = [keys[i] for i in new]
+        data = "".join(f"{key}\n" for key in keys).encode("utf-8")
+        with open(self._dir / "vectors.bin", "ab") as f:
+            f.write(vectors[new].astype(self.dtype).tobytes())
+        with open(self._dir / "keys.txt", "ab") as f:
+            f.write(data)
+        for i, key in enumerate(keys):
+            self._rows[key] = self._n_rows + i
+        self._n_rows += len(keys)
+        self._keys_offset += len(data)
+
+    def _disk_lookup(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """在磁盘层查找一组键，返回命中的向量；可能已被其他进程写入，每次查找至多重新同步一次"""
+        found = {}
+        with self._lock:
+            refreshed = False
+            for key in keys:
+                vector = self._disk_get(key)
+                if vector is None and not refreshed:
+                    refreshed = True
+                    self._refresh()
+                    vector = self._disk_get(key)
+                if vector is not None:
+                    found[key] = vector
+        return found
+
+    def _resolve(self, keys: List[str], vectors: List[Optional[np.ndarray]], found: Dict[str, np.ndarray]):
+        """用磁盘层的命中补齐内存层的结果，并回填内存层"""
+        results = []
+        for key, vector in zip(keys, vectors):
+            if vector is None:
+                vector = found.get(key)
+                if vector is not None:
+                    self.disk_hits += 1
+                    self.memory.set(key, vector)
+                else:
+                    self.misses += 1
+            results.append(None if vector is None else vector.tolist())
+        return results
+
+    def _memory_lookup(self, texts: List[str]):
+        keys = [self.key(text) for text in texts]
+        vectors = [self.memory.get(key) for key in keys]
+        missing = [key for key, vector in zip(keys, vectors) if vector is None] if self._dir is not None else []
+        return keys, vectors, missing
+
+    def lookup(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """返回与 texts 对齐的向量列表，未命中的位置为 None"""
+        keys, vectors, missing = self._memory_lookup(texts)
+        found = self._disk_lookup(missing) if missing else {}
+        return self._resolve(keys, vectors, found)
+
+    async def lookup_async(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """异步版本：内存层命中时直接返回，磁盘层的读取与文件锁放到线程中，不阻塞事件循环"""
+        keys, vectors, missing = self._memory_lookup(texts)
+        found = await asyncio.to_thread(self._disk_lookup, missing) if missing else {}
+        return self._resolve(keys, vectors, found)
+
+    def _remember(self, texts: List[str], embeddings: List[List[float]]):
+        """写入内存层，返回需要落盘的键与向量；同一批内的重复文本只落盘一次"""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        keys = [self.key(text) for text in texts]
+        for key, vector in zip(keys, vectors):
+            self.memory.set(key, vector)
+        if self._dir is None:
+            return [], vectors[:0]
+        seen = set()
+        new = [i for i, key in enumerate(keys) if key not in self._rows and not (key in seen or seen.add(key))]
+        return [keys[i] for i in new], vectors[new]
+
+    def _disk_store(self, keys: List[str], vectors: np.ndarray):
+        with self._lock, self._file_lock():
+            self._disk_put(keys, vectors)
+
+    def store(self, texts: List[str], embeddings: List[List[float]]):
+        if not texts:
+            return
+        keys, vectors = self._remember(texts, embeddings)
+        if keys:
+            self._disk_store(keys, vectors)
+
+    async def store_async(self, texts: List[str], embeddings: List[List[float]]):
+        """异步版本：落盘（包括等待其他进程持有的文件锁）放到线程中"""
+        if not texts:
+            return
+        keys, vectors = self._remember(texts, embeddings)
+        if keys:
+            await asyncio.to_thread(self._disk_store, keys, vectors)
+
+    def _missing(self, texts: List[str], cached: List[Optional[List[float]]]):
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        # 归一化后相同的文本只请求一次上游
+        unique = list({self.key(texts[i]): texts[i] for i in missing}.values())
+        return missing, unique
+
+    def _merge(self, texts, cached, missing, unique, fetched):
+        by_key = {self.key(text): vector for text, vector in zip(unique, fetched)}
+        for i in missing:
+            cached[i] = by_key[self.key(texts[i])]
+        return cached
+
+    def embed_sync(self, texts: List[str], fetch: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """同步版本：只对未命中的文本调用 fetch"""
+        cached = self.lookup(texts)
+        missing, unique = self._missing(texts, cached)
+        if not unique:
+            return cached
+        fetched = [list(map(float, vector)) for vector in fetch(unique)]
+        self.store(unique, fetched)
+        return self._merge(texts, cached, missing, unique, fetched)
+
+    async def embed(self, texts: List[str], fetch: Callable[[List[str]], Awaitable[List[List[float]]]]) -> List[List[float]]:
+        """异步版本：只对未命中的文本调用 fetch；磁盘层的读写不在事件循环上进行"""
+        cached = await self.lookup_async(texts)
+        missing, unique = self._missing(texts, cached)
+        if not unique:
+            return cached
+        fetched = await fetch(unique)
+        await self.store_async(unique, fetched)
+        return self._merge(texts, cached, missing, unique, fetched)
+
+    def stats(self) -> Dict:
+        memory = self.memory.stats()
+        hits = memory["hits"] + self.disk_hits
+        total = hits + self.misses
+        return {
+            "model": self.model,
+            "memory_size": memory["size"],
+            "disk_size": len(self._rows),
+            "memory_hits": memory["hits"],
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / total if total else 0.0
+        }
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model: str) -> Optional[EmbeddingCache]:
+    """按模型名获取共享的缓存实例；关闭缓存时返回 None"""
+    if not settings.embedding_cache_enabled:
+        return None
+    with _caches_lock:
+        if model not in _caches:
+            _caches[model] = EmbeddingCache(
+                model,
+                path=settings.embedding_cache_path or None,
+                memory_size=settings.embedding_cache_memory_size,
+                dtype=settings.embedding_cache_dtype
+            )
+        return _caches[model]
+
+def embedding_cache_stats() -> List[Dict]:
+    return [cache.stats() for cache in _caches.values()]
@@ -1,32 +1,101 @@
 import os
 import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Union, List
+from typing import Deque, Iterator, NamedTuple, Union, List, Optional
 # import pdfplumber
-from bs4 import BeautifulSoup
-from PyPDF2 import PdfReader
+from config import settings
+
+class PageText(NamedTuple):
+    page: int  # 页码，从 1 开始
+    offset: int  # 该页在整篇文本中的起始字符偏移
+    text: str
+
+# 子进程内打开的 PDF，每个进程只解析一次文件结构
+_reader = None
+
+def _open_reader(file_path: str):
+    global _reader
+    from PyPDF2 import PdfReader
+    _reader = PdfReader(file_path)
+
+def _extract_page_range(start: int, end: int) -> List[str]:
+    """在子进程中提取 [start, end) 范围内的页面"""
+    return [(_reader.pages[i].extract_text() or "") for i in range(start, end)]
 
 class FileProcessor:
     @staticmethod
-    def extract_text_from_pdf(file_path: Union[str, Path]) -> str:
-        text = ""
+    def iter_pdf_pages(
+        file_path: Union[str, Path],
+        workers: Optional[int] = None,
+        pages_per_task: int = 8
+    ) -> Iterator[PageText]:
+        """逐页产出 PDF 文本；workers > 1 时将页面分段交给进程池并行提取，仍按页序产出
+
+        同时在途的分段不超过 workers 个，消费者处理得慢时提取也随之暂停，内存占用不随页数增长；
+        提前关闭生成器时取消尚未开始的分段，不等待正在提取的分段
+        """
+        # PyPDF2 与 bs4 只在处理文件时才导入，不拖慢服务启动
+        from PyPDF2 import PdfReader
+        if workers is None:
+            workers = settings.pdf_extract_workers or os.cpu_count() or 1
         with open(file_path, 'rb') as f:
             reader = PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+            n_pages = len(reader.pages)
+            if workers <= 1 or n_pages <= pages_per_task:
+                yield from FileProcessor._with_offsets(page.extract_text() or "" for page in reader.pages)
+                return
+
+        ranges = [
+            (start, min(start + pages_per_task, n_pages))
+            for start in range(0, n_pages, pages_per_task)
+        ]
+        workers = min(workers, len(ranges))
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_open_reader, initargs=(str(file_path),))
+        remaining = iter(ranges)
+        pending: Deque[Future] = deque(
+            executor.submit(_extract_page_range, start, end) for start, end in islice(remaining, workers)
+        )
+
+        def texts() -> Iterator[str]:
+            while pending:
+                result = pending.popleft().result()
+                for start, end in islice(remaining, 1):
+                    pending.append(executor.submit(_extract_page_range, start, end))
+                yield from result
+
+        finished = False
+        try:
+            yield from FileProcessor._with_offsets(texts())
+            finished = True
+        finally:
+            executor.shutdown(wait=finished, cancel_futures=not finished)
+
+    @staticmethod
+    def _with_offsets(texts: Iterator[str]) -> Iterator[PageText]:
+        # 页面之间以一个换行符连接，与 extract_text_from_pdf 的拼接方式一致
+        offset = 0
+        for i, text in enumerate(texts):
+            yield PageText(i + 1, offset, text)
+            offset += len(text) + 1
+
+    @staticmethod
+    def extract_text_from_pdf(file_path: Union[str, Path], workers: Optional[int] = None) -> str:
+        return "\n".join(page.text for page in FileProcessor.iter_pdf_pages(file_path, workers=workers))
 
     @staticmethod
     def extract_text_from_latex_zip(zip_path: Union[str, Path]) -> str:
-        text = ""
+        texts = []
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
             for file_info in zip_ref.infolist():
                 if file_info.filename.endswith('.tex'):
                     with zip_ref.open(file_info) as f:
                         content = f.read().decode('utf-8')
                         # 移除LaTeX命令
-                        text += FileProcessor._clean_latex(content) + "\n"
-        return text.strip()
+                        texts.append(FileProcessor._clean_latex(content))
+        return "\n".join(texts).strip()
 
     @staticmethod
     def _clean_latex(text: str) -> str:
@@ -40,5 +109,6 @@ class FileProcessor:
 
     @staticmethod
     def extract_text_from_html(html: str) -> str:
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html, 'html.parser')
         return soup.get_text(separator=' ', strip=True)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from config import settings
+from utils.cache import LRUCache
+
+class LLMResponseCache:
+    """LLM 响应缓存
+
+    精确匹配：以 (用途, 模型, 消息) 的哈希为键，存于带 TTL 的 LRU 中。
+    语义匹配（可选）：另存最近 semantic_size 条输入的归一化嵌入（环形缓冲），
+    新输入与其中某条的余弦相似度达到阈值时直接复用该条的响应。
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float], semantic_size: int, semantic_threshold: float):
+        self.exact = LRUCache(maxsize, ttl)
+        self.ttl = ttl
+        self.semantic_size = semantic_size
+        self.semantic_threshold = semantic_threshold
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[tuple]] = [None] * semantic_size  # (过期时间, 响应)
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind: str, model: str, messages: List[Dict[str, Any]]) -> str:
+        payload = json.dumps([kind, model, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        return self.exact.get(key)
+
+    def set(self, key: str, value: Any, vector: Optional[List[float]] = None):
+        self.exact.set(key, value)
+        if vector is not None and self.semantic_size > 0:
+            self._semantic_set(vector, value)
+
+    def semantic_get(self, vector: List[float]) -> Any:
+        query = self._normalize(vector)
+        with self._lock:
+            if self._vectors is not None and self._vectors.shape[1] == len(query):
+                similarities = self._vectors @ query
+                now = time.monotonic()
+                for row in np.argsort(-similarities):
+                    entry = self._entries[row]
+                    if similarities[row] < self.semantic_threshold:
+                        break
+                    if entry is not None and (entry[0] is None or entry[0] >= now):
+                        self.semantic_hits += 1
+                        return entry[1]
+            self.semantic_misses += 1
+            return None
+
+    def _semantic_set(self, vector: List[float], value: Any):
+        vector = self._normalize(vector)
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                # 空槽位为零向量，相似度恒为 0，不会命中
+                self._vectors = np.zeros((self.semantic_size, len(vector)), dtype=np.float32)
+                self._entries = [None] * self.semantic_size
+                self._next = 0
+            self._vectors[self._next] = vector
+            self._entries[self._next] = (expires_at, value)
+            self._next = (self._next + 1) % self.semantic_size
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.semantic_hits + self.semantic_misses
+        return {
+            "exact": self.exact.stats(),
+            "semantic": {
+                "enabled": settings.llm_cache_semantic,
+                "size": sum(entry is not None for entry in self._entries),
+                "maxsize": self.semantic_size,
+                "threshold": self.semantic_threshold,
+                "hits": self.semantic_hits,
+                "misses": self.semantic_misses,
+                "hit_rate": self.semantic_hits / total if total else 0.0
+            }
+        }
+
+llm_cache = LLMResponseCache(
+    settings.llm_cache_size,
+    settings.llm_cache_ttl,
+    settings.llm_cache_semantic_size,
+    settings.llm_cache_semantic_threshold
+)
@@ -0,0 +1,43 @@
+from typing import List, Optional
+import numpy as np
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def mmr_select(
+    query: np.ndarray,
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+    dedup_threshold: Optional[float] = None
+) -> List[int]:
+    """最大边际相关性选择，返回被选中的候选下标（按选中顺序）
+
+    每一步选 lambda * 相关度 - (1 - lambda) * 与已选集合的最大相似度 最高的候选；
+    与已选结果的余弦相似度达到 dedup_threshold 的候选视为重复，直接丢弃。
+    相似度矩阵一次算出，每步只做一次向量化的 max 更新。
+    """
+    if len(embeddings) == 0 or k <= 0:
+        return []
+    embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+    query = _normalize(np.asarray(query, dtype=np.float32))
+    relevance = embeddings @ query
+    similarity = embeddings @ embeddings.T
+
+    max_similarity = np.full(len(embeddings), -np.inf, dtype=np.float32)
+    available = np.ones(len(embeddings), dtype=bool)
+    selected: List[int] = []
+    while len(selected) < k and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        if dedup_threshold is not None:
+            available &= max_similarity < dedup_threshold
+    return selected
@@ -0,0 +1,44 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """合并相同键的并发调用：同一时刻只执行一次，其余调用等待同一个任务，共享结果或异常
+
+    任务结束即移除，不缓存结果。等待方被取消（如客户端断开）不会取消共享任务。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """由请求内容生成规范化的键，字段顺序不影响结果"""
+        return json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # 取走异常，避免所有等待方都已离开时出现 "exception was never retrieved"
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "followers": self.followers}
+
+single_flight = SingleFlight()
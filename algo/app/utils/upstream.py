@@ -0,0 +1,229 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+import httpx
+
+T = TypeVar("T")
+
+class UpstreamSaturated(Exception):
+    """所有上游都已满载且等待队列已满（或等待超时），由调用方转换为 429"""
+
+    def __init__(self, pool: str):
+        super().__init__(f"All {pool} upstreams are saturated")
+        self.pool = pool
+
+def split_urls(urls: str, default: str) -> List[str]:
+    """解析逗号分隔的上游地址列表，为空时使用 default"""
+    return [url.strip() for url in urls.split(",") if url.strip()] or [default]
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """被动健康检查的信号：连接/超时错误、5xx 与 429 计为上游故障，其他 4xx 属于请求本身的问题"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, httpx.TransportError)
+
+class Upstream:
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.failures = 0  # 连续失败次数
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.latency = 0.0  # 成功请求耗时的指数滑动平均（秒）
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy(time.monotonic()),
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "latency_ms": round(self.latency * 1000, 1)
+        }
+
+class UpstreamPool:
+    """一组等价上游的客户端侧负载均衡
+
+    - 路由：在健康且未达并发上限的上游中选在途请求最少的（相同时选平均延迟低的）
+    - 背压：没有可用上游时进入有界等待队列，队列已满或等待超时抛出 UpstreamSaturated
+    - 对冲：请求超过 hedge_after 秒仍未返回时，向另一个空闲上游再发一份，取先成功的结果
+    - 被动健康检查：连续失败 failure_threshold 次的上游被摘除 eject_seconds 秒；
+      全部上游都被摘除时仍允许请求通过，作为探测
+    只在事件循环内使用，不需要加锁。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        urls: List[str],
+        max_concurrency: int = 8,
+        queue_size: int = 64,
+        queue_timeout: float = 30.0,
+        hedge_after: float = 0.0,
+        failure_threshold: int = 3,
+        eject_seconds: float = 30.0
+    ):
+        self.name = name
+        self.upstreams = [Upstream(url, max_concurrency) for url in urls]
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.rejected = 0
+        self.hedged = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def _pick(self, exclude: Optional[List[Upstream]] = None) -> Optional[Upstream]:
+        now = time.monotonic()
+        candidates = [
+            upstream for upstream in self.upstreams
+            if upstream.outstanding < upstream.max_concurrency and (not exclude or upstream not in exclude)
+        ]
+        healthy = [upstream for upstream in candidates if upstream.healthy(now)]
+        if healthy:
+            candidates = healthy
+        elif any(upstream.healthy(now) for upstream in self.upstreams):
+            return None
+        if not candidates:
+            return None
+        upstream = min(candidates, key=lambda u: (u.outstanding, u.latency))
+        upstream.outstanding += 1
+        return upstream
+
+    async def acquire(self) -> Upstream:
+        upstream = self._pick()
+        if upstream is not None:
+            return upstream
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise UpstreamSaturated(self.name)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            return await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return future.result()
+            self.rejected += 1
+            raise UpstreamSaturated(self.name)
+        except asyncio.CancelledError:
+            # 名额已经交给本请求但调用方被取消：归还名额，否则 outstanding 永远不会减回来
+            if future.done() and not future.cancelled():
+                self._free(future.result())
+            raise
+        finally:
+            if future in self._waiters:
+                self._waiters.remove(future)
+
+    def release(self, upstream: Upstream, error: Optional[BaseException] = None, latency: Optional[float] = None):
+        upstream.requests += 1
+        if error is not None and is_upstream_failure(error):
+            upstream.errors += 1
+            upstream.failures += 1
+            if upstream.failures >= self.failure_threshold:
+                print(f"Ejecting {self.name} upstream {upstream.url} for {self.eject_seconds}s: {str(error)}")
+                upstream.ejected_until = time.monotonic() + self.eject_seconds
+                upstream.ejections += 1
+                upstream.failures = 0
+        elif error is None:
+            upstream.failures = 0
+            if latency is not None:
+                upstream.latency = latency if not upstream.latency else 0.8 * upstream.latency + 0.2 * latency
+        self._free(upstream)
+
+    def _free(self, upstream: Upstream):
+        """归还名额并交给排队的请求，不更新健康统计"""
+        upstream.outstanding -= 1
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            next_upstream = self._pick()
+            if next_upstream is None:
+                break
+            self._waiters.popleft()
+            waiter.set_result(next_upstream)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[str]:
+        """占用一个上游直到退出上下文，用于流式请求（不做对冲）"""
+        upstream = await self.acquire()
+        start = time.monotonic()
+        try:
+            yield upstream.url
+        except asyncio.CancelledError:
+            self._free(upstream)
+            raise
+        except BaseException as e:
+            self.release(upstream, error=e)
+            raise
+        else:
+            self.release(upstream, latency=time.monotonic() - start)
+
+    async def request(self, send: Callable[[str], Awaitable[T]]) -> T:
+        """send(url) 发出一次请求；慢请求会在另一个上游上对冲一次"""
+
+        async def attempt(upstream: Upstream) -> T:
+            start = time.monotonic()
+            try:
+                result = await send(upstream.url)
+            except asyncio.CancelledError:
+                # 对冲中落败被取消，不计入健康统计
+                self._free(upstream)
+                raise
+            except Exception as e:
+                self.release(upstream, error=e)
+                raise
+            self.release(upstream, latency=time.monotonic() - start)
+            return result
+
+        first = await self.acquire()
+        tried = [first]
+        pending = {asyncio.ensure_future(attempt(first))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                can_hedge = self.hedge_after > 0 and len(tried) < 2 and len(self.upstreams) > 1
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_after if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not done or (not pending and len(tried) < 2 and is_upstream_failure(error)):
+                    # 超过对冲阈值仍未返回，或唯一的请求因上游故障失败：换一个上游再发
+                    upstream = self._pick(exclude=tried)
+                    if upstream is not None:
+                        if not done:
+                            self.hedged += 1
+                        tried.append(upstream)
+                        pending.add(asyncio.ensure_future(attempt(upstream)))
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "waiting": len(self._waiters),
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "upstreams": [upstream.stats() for upstream in self.upstreams]
+        }
@@ -1,19 +1,76 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from typing import AsyncIterator, Dict, Optional
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base
+from config import settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+is_sqlite = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "sqlite"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+# 连接池参数对 SQLite 与 Postgres（postgresql+asyncpg://...）同样适用
+engine = create_async_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=not is_sqlite
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        """每个新连接上设置：WAL 让读写互不阻塞，NORMAL 同步在 WAL 下仍保证一致性且写入更快"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        # 负数表示以 KiB 为单位
+        cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+        # 写锁被占用时等待而不是立即报 database is locked
+        cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+# 提交后不过期对象，避免在异步会话中访问属性时触发隐式 IO
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+# 旧版本创建的表缺少的列：表名 -> {列名: 已有行的默认值（SQL 字面量），None 表示可为空}；
+# create_all 不会修改已存在的表，由 init_db 补齐
+ADDED_COLUMNS: Dict[str, Dict[str, Optional[str]]] = {
+    # 旧版本上传时同步入库，已有文件视为已完成
+    "files": {"job_id": None, "status": "'done'", "chunk_count": "0", "error": None},
+    # 预计算的检索上下文，为空时生成接口现场检索并在后台补上
+    "documents": {"retrieval_query": None, "title_embedding": None, "retrieval_context": None, "retrieval_updated_at": None},
+}
+
+def add_missing_columns(conn):
+    """兼容旧版本创建的数据库：按 ADDED_COLUMNS 用 ALTER TABLE ADD COLUMN 补齐缺失的列"""
+    inspector = inspect(conn)
+    for table_name, columns in ADDED_COLUMNS.items():
+        if not inspector.has_table(table_name):
+            continue
+        # SQLite 上即 PRAGMA table_info
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        for name, default in columns.items():
+            if name in existing:
+                continue
+            column = Base.metadata.tables[table_name].c[name]
+            ddl = f"ALTER TABLE {table_name} ADD COLUMN {name} {column.type.compile(dialect=conn.dialect)}"
+            if default is not None:
+                ddl += f" {'' if column.nullable else 'NOT NULL '}DEFAULT {default}"
+            print(f"Adding column {table_name}.{name}")
+            conn.execute(text(ddl))
+
+async def init_db():
+    """创建缺失的表并补齐旧表缺失的列；调用前需先导入全部模型"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns)
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,9 +1,13 @@
-from fastapi import FastAPI, Depends
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
 from routers import auth, files, document
-from database import engine
+from database import engine, init_db
 from models.user import User
 from fastapi.middleware.cors import CORSMiddleware
-from security import get_current_user
+from security import get_current_user, password_executor
+from service.algo_client import AlgoUnavailable, algo_client
 
 import subprocess
 
@@ -17,13 +21,27 @@ def check_pandoc_available():
             "请安装pandoc: https://pandoc.org/installing.html"
         )
 
-User.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await init_db()
+    try:
+        check_pandoc_available()
+    except RuntimeError as e:
+        print(f"警告: {str(e)}")
+    watcher = asyncio.create_task(files.watch_ingestion())
+    yield
+    watcher.cancel()
+    await document.wait_for_saves()
+    await algo_client.close()
+    await engine.dispose()
+    password_executor.shutdown(wait=False)
 
 app = FastAPI(
     title="Auth API",
     version="0.1.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -50,17 +68,24 @@ app.include_router(
     dependencies=[Depends(get_current_user)]  # 保持安全验证一致
 )
 
-@app.on_event("startup")
-async def startup_event():
-    try:
-        check_pandoc_available()
-    except RuntimeError as e:
-        print(f"警告: {str(e)}")
+@app.exception_handler(AlgoUnavailable)
+async def algo_unavailable_handler(request: Request, exc: AlgoUnavailable):
+    # 算法后端熔断期间快速失败，提示客户端稍后重试
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))}
+    )
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/algo")
+async def algo_stats():
+    """算法后端的熔断状态、重试次数与各接口的延迟直方图"""
+    return algo_client.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=11451)
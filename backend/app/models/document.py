@@ -12,5 +12,10 @@ class Document(Base):
     config = Column(JSON, default={})  # 可配置项
     content = Column(JSON, nullable=False)  # 结构化内容
     created_at = Column(DateTime, default=datetime.now)
+    # 预先计算的检索结果：retrieval_query 为计算时使用的标题，与当前标题不一致即视为过期
+    retrieval_query = Column(String(255), nullable=True)
+    title_embedding = Column(JSON, nullable=True)
+    retrieval_context = Column(Text, nullable=True)
+    retrieval_updated_at = Column(DateTime, nullable=True)
     
     owner = relationship("User", back_populates="documents")
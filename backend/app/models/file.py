@@ -14,5 +14,9 @@ class File(Base):
     upload_time = Column(DateTime, default=datetime.now, nullable=False)
     # processed = Column(Boolean, default=False)  # 是否被大模型处理
     storage_path = Column(String(512), unique=True)  # 实际存储路径
+    job_id = Column(String(64))  # 算法后端的入库任务 ID
+    status = Column(String(20), default="queued", nullable=False)  # queued/extracting/embedding/done/failed
+    chunk_count = Column(Integer, default=0, nullable=False)
+    error = Column(String(512))
     
     owner = relationship("User", back_populates="files")
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.user import User
 from schemas.auth import LoginRequest, LoginSuccessResponse, LoginFailedResponse
-from security import verify_password, create_access_token
+from security import verify_password_async, create_access_token
 from database import get_db
 
 router = APIRouter()
@@ -15,9 +16,9 @@ router = APIRouter()
 )
 async def login(
     request: LoginRequest, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    user = db.query(User).filter(User.username == request.username).first()
+    user = await db.scalar(select(User).where(User.username == request.username))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -25,7 +26,7 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not verify_password(request.password, user.hashed_password):
+    if not await verify_password_async(request.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -1,18 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.document import Document
-from schemas.document import DocumentCreate, DocumentInDB, DocumentUpdate, ExportFormat
-from database import get_db
+from schemas.document import (
+    BatchGenerateRequest,
+    DocumentCreate,
+    DocumentInDB,
+    DocumentUpdate,
+    ExportFormat,
+    SectionPrompt
+)
+from config import settings
+from database import SessionLocal, get_db
 from security import get_current_user
-from models.user import User
-from typing import Dict, Any
+from schemas.auth import CurrentUser
+from typing import Dict, Any, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
 import zipfile
 from pathlib import Path
 import os
 from markdown import markdown
 from weasyprint import HTML
 from service.ai_service import AIService
+from service.retrieval import RetrievalService
+
+logger = logging.getLogger(__name__)
 
 def markdown_to_pdf(md_file_path, pdf_file_path):
     # Read the markdown file
@@ -46,93 +62,109 @@ router = APIRouter()
 EXPORT_DIR = "exports"
 os.makedirs(EXPORT_DIR, exist_ok=True)
 
+# 进行中的批量生成写回任务；事件循环只持有任务的弱引用，需在这里保留到完成
+pending_saves: Set[asyncio.Task] = set()
+
+async def wait_for_saves():
+    """关闭应用前等待进行中的写回完成"""
+    if pending_saves:
+        await asyncio.gather(*pending_saves, return_exceptions=True)
+
 @router.post("/", response_model=DocumentInDB)
-def create_document(
+async def create_document(
     document: DocumentCreate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
     db_document = Document(
         **document.dict(),
         user_id=user.id
     )
     db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
+    await db.commit()
+    await db.refresh(db_document)
+    # 后台预先计算标题的检索上下文
+    background_tasks.add_task(RetrievalService.refresh_document, db_document.id)
     return db_document
 
 @router.get("/", response_model=list[DocumentInDB])
-def list_documents(
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+async def list_documents(
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
-    return db.query(Document).filter(Document.user_id == user.id).all()
+    return (await db.scalars(select(Document).where(Document.user_id == user.id))).all()
 
 @router.delete("/{doc_id}")
-def delete_document(
+async def delete_document(
     doc_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
-    document = db.query(Document).filter(
+    document = await db.scalar(select(Document).where(
         Document.id == doc_id,
         Document.user_id == user.id
-    ).first()
+    ))
     if not document:
         raise HTTPException(404, "Document not found")
     
-    db.delete(document)
-    db.commit()
+    await db.delete(document)
+    await db.commit()
     return {"message": "Document deleted"}
 
 @router.get("/{doc_id}", response_model=DocumentInDB)
-def get_document(
+async def get_document(
     doc_id: int,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
-    document = db.query(Document).filter(
+    document = await db.scalar(select(Document).where(
         Document.id == doc_id,
         Document.user_id == user.id
-    ).first()
+    ))
     
     if not document:
         raise HTTPException(404, "Document not found")
     return document
 
 @router.put("/{doc_id}", response_model=DocumentInDB)
-def update_document(
+async def update_document(
     doc_id: int,
     document: DocumentUpdate,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
-    db_document = db.query(Document).filter(
+    db_document = await db.scalar(select(Document).where(
         Document.id == doc_id,
         Document.user_id == user.id
-    ).first()
+    ))
     
     if not db_document:
         raise HTTPException(404, "Document not found")
     
+    old_title = db_document.title
     for field, value in document.dict(exclude_unset=True).items():
         setattr(db_document, field, value)
     
-    db.commit()
-    db.refresh(db_document)
+    await db.commit()
+    await db.refresh(db_document)
+    if db_document.title != old_title:
+        background_tasks.add_task(RetrievalService.refresh_document, db_document.id)
     return db_document
 
 @router.post("/{doc_id}/generate", response_model=Dict[str, Any])
-def generate_content(
+async def generate_content(
     doc_id: int,
     prompt: Dict[str, Any],
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
     
     if prompt["type"] == "chat":
         return {
-            "content": AIService.chat_completion(
+            "content": await AIService.chat_completion(
                 messages=[{
                     "role": "user",
                     "content": prompt.get("prompt", "")
@@ -142,23 +174,19 @@ def generate_content(
         }
 
     # 获取当前文档
-    document = db.query(Document).filter(
+    document = await db.scalar(select(Document).where(
         Document.id == doc_id,
         Document.user_id == user.id
-    ).first()
+    ))
     
     if not document:
         raise HTTPException(404, "Document not found")
     
-    # 查询相关文献
-    related_docs = AIService.query_related_documents(document.title, f"user_{user.id}")
-    # context = "\n\n".join(related_docs) if related_docs else ""
-    # print(context)
-    context = related_docs
+    context = await RetrievalService.document_context(document, background_tasks)
     
     print(prompt)
     # 生成内容
-    content = AIService.generate_content(
+    content = await AIService.generate_content(
         prompt=prompt.get("prompt", ""),
         context=context
     )
@@ -168,17 +196,158 @@ def generate_content(
         "type": prompt.get("type", "paragraph")
     }
 
+@router.post("/{doc_id}/generate/stream")
+async def generate_content_stream(
+    doc_id: int,
+    prompt: Dict[str, Any],
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """以 SSE 流式返回生成内容，浏览器断开时取消上游生成"""
+    document = await db.scalar(select(Document).where(
+        Document.id == doc_id,
+        Document.user_id == user.id
+    ))
+    
+    if not document:
+        raise HTTPException(404, "Document not found")
+    
+    context = await RetrievalService.document_context(document, background_tasks)
+
+    async def event_stream():
+        stream = AIService.generate_content_stream(
+            prompt=prompt.get("prompt", ""),
+            context=context
+        )
+        try:
+            async for chunk in stream:
+                if await request.is_disconnected():
+                    break
+                yield chunk
+        except Exception:
+            logger.exception("Streaming generation failed for document %s", doc_id)
+            # 异常信息可能含换行且暴露内部细节，只返回 JSON 编码的概要
+            error = {"error": "Generation failed"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n".encode()
+        finally:
+            # 关闭上游流，释放 LLM 占用
+            await stream.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/{doc_id}/generate/batch")
+async def generate_batch(
+    doc_id: int,
+    body: BatchGenerateRequest,
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
+):
+    """整篇批量生成：每个不同的检索查询只检索一次，段落生成按配置的并发数并行，
+    每完成一段就以 SSE 事件返回，全部结束（或客户端断开）后在一个事务中写回文档
+    """
+    document = await db.scalar(select(Document).where(
+        Document.id == doc_id,
+        Document.user_id == user.id
+    ))
+
+    if not document:
+        raise HTTPException(404, "Document not found")
+
+    title = document.title
+    cached_context = RetrievalService.cached_context(document)
+    collection_name = f"user_{user.id}"
+    user_id = user.id
+
+    async def event_stream():
+        semaphore = asyncio.Semaphore(settings.GENERATE_BATCH_CONCURRENCY)
+        contexts: Dict[str, asyncio.Future] = {}
+        if cached_context is not None:
+            contexts[title] = asyncio.get_running_loop().create_future()
+            contexts[title].set_result(cached_context)
+        for section in body.sections:
+            query = section.query or title
+            if query not in contexts:
+                contexts[query] = asyncio.ensure_future(AIService.build_context(query, collection_name))
+
+        async def generate(section: SectionPrompt) -> Tuple[SectionPrompt, Optional[str], Optional[str]]:
+            try:
+                context = await contexts[section.query or title]
+                async with semaphore:
+                    content = await AIService.generate_content(section.prompt, context)
+                return section, content, None
+            except Exception as e:
+                return section, None, str(e)
+
+        tasks = [asyncio.ensure_future(generate(section)) for section in body.sections]
+        generated: List[Tuple[SectionPrompt, str]] = []
+        try:
+            for future in asyncio.as_completed(tasks):
+                section, content, error = await future
+                if error is None:
+                    generated.append((section, content))
+                    event = {"id": section.id, "content": content}
+                else:
+                    print(f"Failed to generate section {section.id}: {error}")
+                    event = {"id": section.id, "error": error}
+                yield f"event: section\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            for task in list(tasks) + list(contexts.values()):
+                task.cancel()
+            # 已完成的段落一次性写回，客户端中途断开也不丢失
+            if generated:
+                # 客户端断开时流被取消：写回作为独立任务继续执行，shield 只让这里不等待它
+                save = asyncio.create_task(save_generated_sections(doc_id, user_id, generated))
+                pending_saves.add(save)
+                save.add_done_callback(pending_saves.discard)
+                await asyncio.shield(save)
+        yield f"event: done\ndata: {json.dumps({'saved': len(generated), 'total': len(body.sections)})}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def save_generated_sections(doc_id: int, user_id: int, generated: List[Tuple[SectionPrompt, str]]):
+    """在独立的会话中把生成结果合并进 Document.content.sections 并提交"""
+    async with SessionLocal() as db:
+        document = await db.scalar(select(Document).where(
+            Document.id == doc_id,
+            Document.user_id == user_id
+        ))
+        if not document:
+            return
+        content = dict(document.content or {})
+        sections = [dict(section) for section in content.get("sections", [])]
+        positions = {section.get("id"): i for i, section in enumerate(sections)}
+        for prompt, text in generated:
+            if prompt.id in positions:
+                sections[positions[prompt.id]].update(content=text, isAI=True)
+            else:
+                positions[prompt.id] = len(sections)
+                sections.append({"id": prompt.id, "type": prompt.type, "content": text, "isAI": True})
+        content["sections"] = sections
+        # 重新赋值整个 JSON 字段，SQLAlchemy 才会检测到变更
+        document.content = content
+        await db.commit()
+
 @router.post("/{doc_id}/export")
-def export_document(
+async def export_document(
     doc_id: int,
     export_format: ExportFormat,
-    db: Session = Depends(get_db),
-    user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    user: CurrentUser = Depends(get_current_user)
 ):
-    document = db.query(Document).filter(
+    document = await db.scalar(select(Document).where(
         Document.id == doc_id,
         Document.user_id == user.id
-    ).first()
+    ))
     
     if not document:
         raise HTTPException(404, "Document not found")
@@ -189,7 +358,7 @@ def export_document(
         # 生成PDF文件
         pdf_path = temp_path / f"{document.title}.pdf"
         # 这里需要实现PDF生成逻辑
-        generate_pdf(document.content, pdf_path)
+        await run_in_threadpool(generate_pdf, document.content, pdf_path)
         return FileResponse(
             pdf_path,
             filename=f"{document.title}.pdf",
@@ -199,7 +368,7 @@ def export_document(
     elif export_format.format == "markdown":
         # 生成Markdown文件
         md_path = temp_path / f"{document.title}.md"
-        generate_markdown(document.content, md_path)
+        await run_in_threadpool(generate_markdown, document.content, md_path)
         return FileResponse(
             md_path,
             filename=f"{document.title}.md",
@@ -212,7 +381,7 @@ def export_document(
         latex_dir.mkdir(parents=True, exist_ok=True)
 
         # 生成主tex文件
-        generate_latex(document, latex_dir)
+        await run_in_threadpool(generate_latex, document, latex_dir)
         
         # 创建zip文件
         zip_path = temp_path / f"{document.title}.zip"
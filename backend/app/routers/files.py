@@ -1,27 +1,84 @@
-from fastapi import APIRouter, Depends, UploadFile, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import httpx
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Set
 import os
 import uuid
 from models.file import File
 from fastapi import File as FastAPIFile
-from models.user import User
+from schemas.auth import CurrentUser
 from schemas.file import FileInDB, FileCreate, FileUpdate
-from database import get_db
-from security import get_current_user
-import requests
 from config import settings
+from database import SessionLocal, get_db
+from security import get_current_user
+from service.ai_service import AIService
+from service.retrieval import RetrievalService
 
 router = APIRouter()
 
 UPLOAD_DIR = "../../uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+TERMINAL_STATUSES = ("done", "failed")
+
+async def sync_job_status(
+    db: AsyncSession,
+    files: List[File],
+    background_tasks: Optional[BackgroundTasks] = None
+) -> Set[int]:
+    """从算法后端拉取未完成文件的入库进度并写回 File 记录，返回有文件入库完成的用户；
+    给出 background_tasks 时在后台刷新这些用户文档的预计算检索上下文
+    """
+    pending = {f.job_id: f for f in files if f.job_id and f.status not in TERMINAL_STATUSES}
+    if not pending:
+        return set()
+    try:
+        jobs = await AIService.get_ingestion_jobs(list(pending))
+    except Exception as e:
+        print(f"Failed to fetch ingestion status: {str(e)}")
+        return set()
+    changed_users = set()
+    for job in jobs:
+        db_file = pending[job["id"]]
+        if job["status"] == "done":
+            changed_users.add(db_file.user_id)
+        db_file.status = job["status"]
+        db_file.chunk_count = job["chunks"]
+        db_file.error = (job.get("error") or "")[:512] or None
+    await db.commit()
+    if background_tasks is not None:
+        for user_id in changed_users:
+            background_tasks.add_task(RetrievalService.refresh_user_documents, user_id)
+    return changed_users
+
+async def watch_ingestion():
+    """后台轮询全部未完成的入库任务，入库完成后刷新对应用户的检索上下文，不依赖用户打开文件列表"""
+    while True:
+        await asyncio.sleep(settings.INGEST_POLL_INTERVAL)
+        try:
+            async with SessionLocal() as db:
+                files = list(await db.scalars(select(File).where(
+                    File.job_id.isnot(None),
+                    File.status.notin_(TERMINAL_STATUSES)
+                )))
+                changed_users = await sync_job_status(db, files)
+            for user_id in changed_users:
+                await RetrievalService.refresh_user_documents(user_id)
+        except Exception as e:
+            print(f"Ingestion watcher error: {str(e)}")
+
+def write_upload(file_path: str, contents: bytes):
+    with open(file_path, "wb") as f:
+        f.write(contents)
+
 @router.post("/", response_model=FileInDB)
 async def upload_file(
     file: UploadFile = FastAPIFile(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     # 生成唯一文件名
     ext = file.filename.split('.')[-1]
@@ -30,8 +87,7 @@ async def upload_file(
     
     # 保存文件
     contents = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    await run_in_threadpool(write_upload, file_path, contents)
     
     # 创建数据库记录
     db_file = File(
@@ -43,91 +99,147 @@ async def upload_file(
         # owner=current_user
     )
     db.add(db_file)
-    db.commit()
-    db.refresh(db_file)
+    await db.commit()
+    await db.refresh(db_file)
     
+    # 只提交入库任务，解析、分块与嵌入由算法后端的 worker 异步完成
     try:
-        response = requests.post(
-            f"{settings.ALGO_BASE_URL}/document/process-local",
-            json={
-                "file_path": unique_name,
-                "file_type": file.content_type,
-                "collection_name": f"user_{current_user.id}"
-            }
+        job = await AIService.enqueue_ingestion(
+            unique_name,
+            file.content_type,
+            f"user_{current_user.id}",
+            str(db_file.id)
         )
-        print(response.status_code, response.text)
-        response.raise_for_status()
     except Exception as e:
         print(f"Document processing failed: {str(e)}")
+        db_file.status = "failed"
+        db_file.error = "Failed to enqueue document processing"
+        await db.commit()
         raise HTTPException(
             status_code=500,
             detail="Document processing failed"
         )
 
+    db_file.job_id = job["id"]
+    db_file.status = job["status"]
+    await db.commit()
+    await db.refresh(db_file)
+
     return db_file
 
 @router.get("/", response_model=List[FileInDB])
-def list_files(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def list_files(
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    return db.query(File)\
-        .filter(File.user_id == current_user.id)\
-        .all()
+    files = (await db.scalars(
+        select(File).where(File.user_id == current_user.id)
+    )).all()
+    await sync_job_status(db, files, background_tasks)
+    return files
 
 @router.get("/{file_id}", response_model=FileInDB)
-def get_file(
+async def get_file(
     file_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    file = db.query(File).filter(
+    file = await db.scalar(select(File).where(
         File.id == file_id,
         File.user_id == current_user.id
-    ).first()
+    ))
     
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
+    await sync_job_status(db, [file], background_tasks)
     return file
 
 @router.put("/{file_id}", response_model=FileInDB)
-def update_file(
+async def update_file(
     file_id: int,
     update_data: FileUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    db_file = db.query(File).filter(
+    db_file = await db.scalar(select(File).where(
         File.id == file_id,
         File.user_id == current_user.id
-    ).first()
+    ))
     
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
     
     db_file.filename = update_data.new_filename
-    db.commit()
-    db.refresh(db_file)
+    await db.commit()
+    await db.refresh(db_file)
+    return db_file
+
+@router.post("/{file_id}/reprocess", response_model=FileInDB)
+async def reprocess_file(
+    file_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """重新入库文件，只有内容变化的块会被重新嵌入"""
+    db_file = await db.scalar(select(File).where(
+        File.id == file_id,
+        File.user_id == current_user.id
+    ))
+    
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    try:
+        job = await AIService.enqueue_ingestion(
+            os.path.basename(db_file.storage_path),
+            db_file.file_type,
+            f"user_{current_user.id}",
+            str(db_file.id)
+        )
+    except Exception as e:
+        print(f"Document processing failed: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Document processing failed"
+        )
+
+    db_file.job_id = job["id"]
+    db_file.status = job["status"]
+    db_file.error = None
+    await db.commit()
+    await db.refresh(db_file)
     return db_file
 
 @router.delete("/{file_id}")
-def delete_file(
+async def delete_file(
     file_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    db_file = db.query(File).filter(
+    db_file = await db.scalar(select(File).where(
         File.id == file_id,
         File.user_id == current_user.id
-    ).first()
+    ))
     
     if not db_file:
         raise HTTPException(status_code=404, detail="File not found")
+
+    # 先从检索集合中删除该文件的块，失败时保留记录以便重试，否则刷新后仍会检索到已删除的文件
+    try:
+        await AIService.delete_file_chunks(f"user_{current_user.id}", str(db_file.id))
+    except httpx.HTTPError as e:
+        print(f"Failed to delete chunks of file {file_id}: {str(e)}")
+        raise HTTPException(status_code=502, detail="Failed to remove file from the retrieval index")
     
     # 删除物理文件
     if os.path.exists(db_file.storage_path):
         os.remove(db_file.storage_path)
     
-    db.delete(db_file)
-    db.commit()
+    await db.delete(db_file)
+    await db.commit()
+    # 文献集合变化，重新计算该用户文档的检索上下文
+    background_tasks.add_task(RetrievalService.refresh_user_documents, current_user.id)
     return {"message": "File deleted"}
@@ -10,3 +10,8 @@ class LoginSuccessResponse(BaseModel):
 
 class LoginFailedResponse(BaseModel):
     message: str
+
+class CurrentUser(BaseModel):
+    """认证通过的用户快照，只含路由需要的字段，可跨请求缓存"""
+    id: int
+    username: str
@@ -36,5 +36,14 @@ class GenerateContentRequest(BaseModel):
     type: str
     prompt: Optional[str] = None
     
+class SectionPrompt(BaseModel):
+    id: str  # 要写入的段落 id，文档中不存在时追加新段落
+    prompt: str
+    query: Optional[str] = None  # 检索用的查询，默认为文档标题
+    type: str = "paragraph"
+
+class BatchGenerateRequest(BaseModel):
+    sections: List[SectionPrompt]
+
 class ExportFormat(BaseModel):
     format: str  # "pdf", "markdown", or "latex"
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from pydantic import BaseModel
 
 class FileBase(BaseModel):
@@ -17,6 +18,9 @@ class FileInDB(FileBase):
     user_id: int
     upload_time: datetime
     # processed: bool
+    status: str
+    chunk_count: int
+    error: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,12 +1,19 @@
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+import asyncio
 import os
-from typing import Annotated
-from fastapi import Depends, HTTPException, status
-from database import SessionLocal
-from sqlalchemy.orm import Session
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, Optional, Tuple
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import settings
 from models.user import User
+from schemas.auth import CurrentUser
 from fastapi.security import OAuth2PasswordBearer
 from database import get_db
 
@@ -15,6 +22,11 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt 每次耗时约 100–300 ms，放到有界线程池中执行
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -22,16 +34,71 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+class UserCache:
+    """令牌主体（用户名）到用户快照的 TTL + LRU 缓存；
+    User 被更新或删除时按 id 失效，令牌本身的签名与过期时间仍在每次请求时校验
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, CurrentUser]]" = OrderedDict()
+        # 失效由 ORM 事件触发，可能来自其他线程
+        self._lock = threading.Lock()
+
+    def get(self, subject: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._data.get(subject)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[subject]
+                return None
+            self._data.move_to_end(subject)
+            return entry[1]
+
+    def set(self, subject: str, user: CurrentUser):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[subject] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(subject)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            for subject in [s for s, (_, user) in self._data.items() if user.id == user_id]:
+                del self._data[subject]
+
+user_cache = UserCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target: User):
+    # 用户名可能已被修改，按 id 清除
+    user_cache.invalidate(target.id)
+
 async def get_current_user(
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(OAuth2PasswordBearer(tokenUrl="auth/login"))
-) -> User:
+) -> CurrentUser:
+    # 同一请求中多次依赖（路由级依赖加参数依赖）只解析一次
+    cached = getattr(request.state, "current_user", None)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -45,7 +112,12 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+    current_user = user_cache.get(username)
+    if current_user is None:
+        user = await db.scalar(select(User).where(User.username == username))
+        if user is None:
+            raise credentials_exception
+        current_user = CurrentUser(id=user.id, username=user.username)
+        user_cache.set(username, current_user)
+    request.state.current_user = current_user
+    return current_user
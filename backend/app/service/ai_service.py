@@ -1,20 +1,25 @@
-import requests
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Optional
 from config import settings
 from fastapi import HTTPException
+from service.algo_client import AlgoUnavailable, algo_client
+from service.context_packer import ContextPacker
 
 class AIService:
     @staticmethod
-    def chat_completion(messages: List[Dict[str, str]]) -> str:
+    async def chat_completion(messages: List[Dict[str, str]]) -> str:
         try:
-            response = requests.post(
-                f"{settings.ALGO_BASE_URL}/llm/chat",
+            response = await algo_client.post(
+                "/llm/chat",
                 json={
                     "messages": messages
-                }
+                },
+                # LLM 调用开销大，读超时时服务端可能仍在生成，不重发
+                idempotent=False
             )
             response.raise_for_status()
             return response.json()["choices"][0]["message"]["content"]
+        except AlgoUnavailable:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -22,18 +27,20 @@ class AIService:
             )
 
     @staticmethod
-    def generate_content(prompt: str, context: str = "") -> str:
+    async def generate_content(prompt: str, context: str = "") -> str:
         try:
-            response = requests.post(
-                f"{settings.ALGO_BASE_URL}/llm/generate",
+            response = await algo_client.post(
+                "/llm/generate",
                 json={
                     "prompt": prompt,
                     "context": context
-                }
+                },
+                idempotent=False
             )
-            print(response.status_code, response.content)
             response.raise_for_status()
             return response.json()["content"]
+        except AlgoUnavailable:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -41,19 +48,95 @@ class AIService:
             )
 
     @staticmethod
-    def query_related_documents(query_text: str, collection_name: str = "default", n_results: int = 3) -> list:
+    async def enqueue_ingestion(
+        file_path: str,
+        file_type: str,
+        collection_name: str,
+        file_id: str,
+        mode: str = "incremental"
+    ) -> Dict[str, Any]:
+        """提交后台入库任务，立即返回任务信息"""
+        # 重复提交会产生重复任务，只在请求未发出时重试
+        response = await algo_client.post(
+            "/document/jobs",
+            json={
+                "file_path": file_path,
+                "file_type": file_type,
+                "collection_name": collection_name,
+                "file_id": file_id,
+                "mode": mode
+            },
+            idempotent=False
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    async def delete_file_chunks(collection_name: str, file_id: str) -> int:
+        """从用户的文献集合中删除某个文件的全部块，返回删除的块数；集合不存在时视为已删除"""
+        response = await algo_client.post(
+            "/vector-db/documents/delete",
+            json={"collection_name": collection_name, "where": {"file_id": file_id}}
+        )
+        if response.status_code == 404:
+            return 0
+        response.raise_for_status()
+        return response.json()["count"]
+
+    @staticmethod
+    async def get_ingestion_jobs(job_ids: List[str]) -> List[Dict[str, Any]]:
+        response = await algo_client.post(
+            "/document/jobs/status",
+            json={"ids": job_ids}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    async def generate_content_stream(prompt: str, context: str = "") -> AsyncIterator[bytes]:
+        """透传算法后端的 SSE 流；迭代被中断时关闭上游连接，从而取消上游生成"""
+        async with algo_client.stream(
+            "/llm/generate/stream",
+            json={
+                "prompt": prompt,
+                "context": context
+            }
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                yield chunk
+
+    @staticmethod
+    async def build_context(query_text: str, collection_name: str) -> str:
+        """检索相关文献并打包成预算内的参考资料"""
+        return ContextPacker.pack(await AIService.query_related_documents(query_text, collection_name))
+
+    @staticmethod
+    def query_payload(query_text: str, collection_name: str, n_results: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "collection_name": collection_name,
+            "query_texts": [query_text],
+            "n_results": n_results or settings.CONTEXT_N_RESULTS,
+            # 去掉近似重复的块（如相邻页的重叠内容），减少提示词长度
+            "diversify": True
+        }
+
+    @staticmethod
+    async def query_related_documents(
+        query_text: str,
+        collection_name: str = "default",
+        n_results: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """返回检索结果（documents/distances/metadatas 等，每个字段按查询分组）"""
         try:
-            response = requests.post(
-                f"{settings.ALGO_BASE_URL}/vector-db/query",
-                json={
-                    "collection_name": collection_name,
-                    "query_texts": [query_text],
-                    "n_results": n_results
-                }
+            response = await algo_client.post(
+                "/vector-db/query",
+                json=AIService.query_payload(query_text, collection_name, n_results)
             )
-            print(response.status_code, response.content)
             response.raise_for_status()
-            return response.content.decode()  # 返回第一个查询结果的所有文档
+            return response.json()
+        except AlgoUnavailable:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500,
@@ -0,0 +1,230 @@
+import asyncio
+import bisect
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+from config import settings
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收纳更慢的请求
+LATENCY_BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+# 这些状态码允许重试；熔断统计所有 5xx，429 只是算法后端在限流，不计入熔断
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+class AlgoUnavailable(Exception):
+    """熔断器打开期间直接拒绝请求，由全局异常处理转换为 503"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Algorithm service is unavailable")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """连续失败 threshold 次后打开，reset_after 秒内快速失败；
+    之后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开；
+    探测请求被取消而没有结果时，reset_after 秒后再放行下一个
+    """
+
+    def __init__(self, threshold: int, reset_after: float):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def allow(self):
+        state = self.state
+        if state == "closed":
+            return
+        now = time.monotonic()
+        if state == "half_open" and (self.probe_started is None or now - self.probe_started >= self.reset_after):
+            self.probe_started = now
+            return
+        self.rejected += 1
+        remaining = self.reset_after - (now - self.opened_at)
+        raise AlgoUnavailable(max(remaining, 1.0))
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                print(f"Algorithm service circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds: float, error: bool = False):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """按桶上界估计分位数（毫秒）"""
+        count = sum(self.counts)
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else float("inf")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        buckets = {f"le_{bound}": n for bound, n in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": count,
+            "errors": self.errors,
+            "mean_ms": round(self.total / count * 1000, 1) if count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": buckets
+        }
+
+class AlgoClient:
+    """算法后端的共享客户端
+
+    - 长连接池复用 TCP 连接，由应用的 lifespan 负责关闭
+    - 按接口前缀设置超时：LLM 生成可以很慢，检索、嵌入和任务查询应当很快返回
+    - 连接失败、超时与 429/502/503/504 做有限次重试，退避时间带随机抖动；
+      非幂等请求（提交入库任务、LLM 生成）只在请求未发出（连接失败）时重试
+    - 熔断：算法后端持续故障时直接失败，不再占用 worker 等待超时
+    - 按接口记录延迟直方图
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker(settings.ALGO_BREAKER_THRESHOLD, settings.ALGO_BREAKER_RESET)
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.retries = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.ALGO_BASE_URL,
+                timeout=httpx.Timeout(settings.ALGO_TIMEOUT, connect=settings.ALGO_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=settings.ALGO_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.ALGO_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @staticmethod
+    def timeout_for(path: str) -> httpx.Timeout:
+        # 流式响应下 read 超时是两个数据块之间的最长间隔
+        if path.startswith(("/vector-db/", "/embedding/")):
+            seconds = settings.ALGO_QUERY_TIMEOUT
+        elif path.startswith("/document/"):
+            seconds = settings.ALGO_JOB_TIMEOUT
+        else:
+            seconds = settings.ALGO_TIMEOUT
+        return httpx.Timeout(seconds, connect=settings.ALGO_CONNECT_TIMEOUT)
+
+    def _observe(self, path: str, seconds: float, error: bool):
+        histogram = self.histograms.get(path)
+        if histogram is None:
+            histogram = self.histograms[path] = LatencyHistogram()
+        histogram.observe(seconds, error)
+
+    @staticmethod
+    def _backoff(attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.ALGO_RETRY_MAX_BACKOFF)
+            except ValueError:
+                pass
+        # full jitter：在 [0, base * 2^attempt] 内随机，避免重试同时涌向刚恢复的服务
+        return random.uniform(0, min(settings.ALGO_RETRY_BACKOFF * 2 ** attempt, settings.ALGO_RETRY_MAX_BACKOFF))
+
+    async def post(self, path: str, json: Any = None, idempotent: bool = True) -> httpx.Response:
+        """发送 POST 请求并返回响应，调用方自行检查状态码；重试耗尽后返回最后一次响应或抛出最后一次异常"""
+        attempt = 0
+        while True:
+            self.breaker.allow()
+            start = time.monotonic()
+            try:
+                response = await self.client.post(path, json=json, timeout=self.timeout_for(path))
+            except httpx.TransportError as e:
+                self._observe(path, time.monotonic() - start, error=True)
+                self.breaker.record_failure()
+                # 连接阶段失败时请求一定没有到达服务端，任何请求都可以安全重试
+                retryable = idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+                if not retryable or attempt >= settings.ALGO_RETRIES:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                retryable = response.status_code in RETRYABLE_STATUS
+                self._observe(path, time.monotonic() - start, error=retryable or response.status_code >= 500)
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if not retryable or not idempotent or attempt >= settings.ALGO_RETRIES:
+                    return response
+                delay = self._backoff(attempt, response)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def stream(self, path: str, json: Any = None) -> AsyncIterator[httpx.Response]:
+        """流式 POST，不重试；延迟记录到流结束为止"""
+        self.breaker.allow()
+        start = time.monotonic()
+        error = False
+        try:
+            async with self.client.stream("POST", path, json=json, timeout=self.timeout_for(path)) as response:
+                error = response.status_code >= 500
+                yield response
+        except httpx.TransportError:
+            error = True
+            raise
+        finally:
+            self._observe(path, time.monotonic() - start, error)
+            if error:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": settings.ALGO_BASE_URL,
+            "circuit": self.breaker.stats(),
+            "retries": self.retries,
+            "endpoints": {path: histogram.stats() for path, histogram in sorted(self.histograms.items())}
+        }
+
+algo_client = AlgoClient()
@@ -0,0 +1,77 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from config import settings
+
+# 与 algo/app/utils/chunker.py 中的 CJK_CHARS、_TOKEN_RE、_SENTENCE_RE 和 approx_token_count 保持一致
+# （两个应用分别部署，不共享代码），修改时需同步，否则上下文装箱与分块的 token 预算会不一致
+CJK_CHARS = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"
+_TOKEN_RE = re.compile(f"[{CJK_CHARS}]|[A-Za-z0-9_]+|[^\\s{CJK_CHARS}A-Za-z0-9_]")
+_SENTENCE_RE = re.compile(r"(?<=[。！？；!?;])|(?<=[.])\s+|\n\s*\n")
+
+def count_tokens(text: str) -> int:
+    """近似 token 数：CJK 字符每字一个，拉丁单词约每 4 个字符一个，其余符号各一个"""
+    count = 0
+    for match in _TOKEN_RE.finditer(text):
+        token = match.group()
+        count += (len(token) + 3) // 4 if token[0].isascii() and token[0].isalnum() else 1
+    return count
+
+class ContextPacker:
+    """把检索结果整理成给 LLM 的参考资料：只保留正文，按相关度排序，
+    在 token 预算内装入并在句子边界截断，每段前加简短的来源标记，如 [S1 p.3]
+    """
+
+    @staticmethod
+    def pack(results: Dict[str, Any], budget: Optional[int] = None) -> str:
+        budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+        documents = (results.get("documents") or [[]])[0]
+        distances = (results.get("distances") or [[]])[0] or [0.0] * len(documents)
+        metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(documents)
+
+        sources: Dict[str, int] = {}
+        parts: List[str] = []
+        # 没有距离（纯词法检索）的结果排在后面，彼此之间保持上游的顺序
+        for document, distance, metadata in sorted(
+            zip(documents, distances, metadatas), key=lambda item: (item[1] is None, item[1] or 0.0)
+        ):
+            if not document:
+                continue
+            source, tag = ContextPacker._tag(metadata or {}, sources)
+            remaining = budget - count_tokens(tag) - 1
+            if remaining < settings.CONTEXT_MIN_CHUNK_TOKENS:
+                break
+            text = ContextPacker._truncate(document.strip(), remaining)
+            if not text:
+                # 首句就超出剩余预算，排在后面的较短的块可能仍装得下
+                continue
+            sources.setdefault(source, len(sources) + 1)
+            parts.append(f"{tag} {text}")
+            budget = remaining - count_tokens(text)
+        return "\n".join(parts)
+
+    @staticmethod
+    def _tag(metadata: Dict[str, Any], sources: Dict[str, int]) -> Tuple[str, str]:
+        """返回 (来源键, 来源标记)；同一文件的块共用一个编号，块被装入后才登记编号"""
+        source = str(metadata.get("file_id", len(sources)))
+        number = sources.get(source, len(sources) + 1)
+        page = metadata.get("page")
+        return source, f"[S{number} p.{page}]" if page else f"[S{number}]"
+
+    @staticmethod
+    def _truncate(text: str, budget: int) -> str:
+        """不超过预算时原样返回，否则保留能装下的完整句子"""
+        if count_tokens(text) <= budget:
+            return text
+        kept = ""
+        used = 0
+        for sentence in _SENTENCE_RE.split(text):
+            sentence = sentence.strip() if sentence else ""
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if used + tokens > budget:
+                break
+            # 只在两侧都是 ASCII 字符时插入空格，CJK 句子直接相连
+            kept += " " + sentence if kept[-1:].isascii() and kept and sentence[:1].isascii() else sentence
+            used += tokens
+        return kept
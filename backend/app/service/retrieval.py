@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import List, Optional
+import httpx
+from fastapi import BackgroundTasks
+from sqlalchemy import select
+from database import SessionLocal
+from models.document import Document
+from service.ai_service import AIService
+from service.algo_client import AlgoUnavailable, algo_client
+from service.context_packer import ContextPacker
+
+class RetrievalService:
+    """预先计算文档标题的嵌入与检索上下文，生成时直接读取，检索不在交互的关键路径上"""
+
+    @staticmethod
+    def cached_context(document: Document) -> Optional[str]:
+        """返回与当前标题匹配的预计算上下文，没有、已过期或为空时返回 None；
+        空上下文（当时还没有文献或没有命中）不复用，生成时现场再检索一次
+        """
+        if document.retrieval_context and document.retrieval_query == document.title:
+            return document.retrieval_context
+        return None
+
+    @staticmethod
+    async def document_context(document: Document, background_tasks: BackgroundTasks) -> str:
+        """优先使用预计算的参考资料，没有时现场检索并在后台补上；各生成接口共用"""
+        context = RetrievalService.cached_context(document)
+        if context is None:
+            context = await AIService.build_context(document.title, f"user_{document.user_id}")
+            background_tasks.add_task(RetrievalService.refresh_document, document.id)
+        return context
+
+    @staticmethod
+    async def refresh_document(doc_id: int):
+        """重新计算单个文档的检索上下文；标题未变时复用已保存的标题嵌入"""
+        async with SessionLocal() as db:
+            document = await db.get(Document, doc_id)
+            if not document:
+                return
+            title = document.title
+            collection_name = f"user_{document.user_id}"
+            embedding = document.title_embedding if document.retrieval_query == title else None
+
+        try:
+            if embedding is None:
+                response = await algo_client.post("/embedding/", json={"input": [title]})
+                response.raise_for_status()
+                embedding = response.json()["data"][0]["embedding"]
+            payload = AIService.query_payload(title, collection_name)
+            payload["query_embeddings"] = [embedding]
+            response = await algo_client.post("/vector-db/query", json=payload)
+            if response.status_code == 404:
+                # 用户还没有上传文献，集合不存在
+                context = ""
+            else:
+                response.raise_for_status()
+                context = ContextPacker.pack(response.json())
+        except (httpx.HTTPError, AlgoUnavailable) as e:
+            print(f"Failed to refresh retrieval for document {doc_id}: {str(e)}")
+            return
+
+        async with SessionLocal() as db:
+            document = await db.get(Document, doc_id)
+            # 计算期间标题又被修改时丢弃结果，由那次修改触发的刷新负责
+            if not document or document.title != title:
+                return
+            document.retrieval_query = title
+            document.title_embedding = embedding
+            document.retrieval_context = context
+            document.retrieval_updated_at = datetime.now()
+            await db.commit()
+
+    @staticmethod
+    async def refresh_user_documents(user_id: int):
+        """用户的文献集合变化后，依次刷新其全部文档"""
+        async with SessionLocal() as db:
+            doc_ids: List[int] = list(await db.scalars(select(Document.id).where(Document.user_id == user_id)))
+        for doc_id in doc_ids:
+            await RetrievalService.refresh_document(doc_id)
@@ -1,8 +1,7 @@
-from database import engine
+import asyncio
+from database import init_db
 from models.user import User
 from models.file import File
 from models.document import Document
 
-File.metadata.create_all(bind=engine)
-User.metadata.create_all(bind=engine)
-Document.metadata.create_all(bind=engine)
\ No newline at end of file
+asyncio.run(init_db())